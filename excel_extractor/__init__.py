@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+"""
+Excel图片提取引擎包
+不依赖 tkinter，可在无图形界面的环境中导入使用：
+
+    from excel_extractor import extract
+    report = extract("a.xlsx", "输出目录")
+"""
+
+from .archive import load_archive_index
+from .engine import (
+    PILLOW_AVAILABLE,
+    ExtractionEngine,
+    ExtractionOptions,
+    ExtractionReport,
+    extract,
+    load_placement_index,
+)
+from .placement import PlacementIndex, parse_range
+
+__all__ = [
+    "PILLOW_AVAILABLE",
+    "ExtractionEngine",
+    "ExtractionOptions",
+    "ExtractionReport",
+    "PlacementIndex",
+    "extract",
+    "load_archive_index",
+    "load_placement_index",
+    "parse_range",
+]
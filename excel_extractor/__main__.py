@@ -0,0 +1,9 @@
+# -*- coding: utf-8 -*-
+"""支持 python -m excel_extractor 方式运行命令行工具"""
+
+import sys
+
+from .cli import main
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,218 @@
+# -*- coding: utf-8 -*-
+"""
+单文件归档输出
+功能：把提取结果和合并结果写入一个不压缩（stored）的 ZIP 或 tar 文件，代替成千上万个小文件和目录。
+归档只按顺序追加写入，不回头改写已写出的部分（ZIP 使用数据描述符），可以直接写到网络存储上；
+写完后在归档末尾加入索引（索引.json 和 索引.csv），记录每个文件的工作表、单元格、组合、内容摘要，
+以及文件内容在归档中的偏移和大小，读取单张图片时可以直接定位，不需要解析归档。
+"""
+
+import csv
+import io
+import json
+import os
+import tarfile
+import tempfile
+import zipfile
+from datetime import datetime
+
+from .hashing import DEFAULT_HASH_ALGORITHM, HASH_BUFFER_SIZE, new_hasher
+
+ARCHIVE_FORMATS = ('zip', 'tar')
+# 归档文件名（不含扩展名），保存在输出目录中
+ARCHIVE_NAME = "图片"
+# 归档中的索引文件名（不含扩展名）
+INDEX_NAME = "索引"
+# 索引的字段：归档中的路径、类型（image 提取的图片 / merge 合并图片）、工作表、单元格、单元格目录名、
+# 是否组合图片、来源成员、内容摘要、内容在归档文件中的偏移和大小（字节）
+INDEX_FIELDS = ('path', 'kind', 'sheet', 'cell', 'dir', 'group', 'member', 'digest', 'offset', 'size')
+# 索引先写到临时文件，超过此大小时转存到磁盘
+INDEX_SPOOL_SIZE = 1024 * 1024
+
+
+def check_archive_format(archive_format):
+    if archive_format not in ARCHIVE_FORMATS:
+        raise ValueError(f"不支持的归档格式: {archive_format}")
+
+
+def archive_filename(archive_format):
+    return f"{ARCHIVE_NAME}.{archive_format}"
+
+
+class SequentialFile:
+    """只追加写入的文件：不提供 seek()，zipfile 因此在每个成员后写数据描述符，不回头改写本地文件头"""
+
+    def __init__(self, path):
+        self.file = open(path, 'wb')
+        self.position = 0
+
+    def write(self, data):
+        self.file.write(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+class ArchiveWriter:
+    """按顺序把文件写入 ZIP（stored）或 tar 归档，并记录索引
+
+    先写到 .part 临时文件，close() 写入索引后替换为正式文件；abort() 删除临时文件。
+    不是线程安全的，只能在一个线程中调用 add()。
+    """
+
+    def __init__(self, path, archive_format='zip', hash_algorithm=DEFAULT_HASH_ALGORITHM):
+        check_archive_format(archive_format)
+        self.path = path
+        self.format = archive_format
+        self.hash_algorithm = hash_algorithm
+        self.part_path = path + '.part'
+        self.file = SequentialFile(self.part_path)
+        if archive_format == 'zip':
+            self.archive = zipfile.ZipFile(self.file, 'w', zipfile.ZIP_STORED, allowZip64=True)
+        else:
+            # GNU 格式：UTF-8文件名直接写在文件头中（PAX 格式会为每个非ASCII文件名多写一个扩展头），
+            # 超长文件名和超过8GB的文件也能保存
+            self.archive = tarfile.open(fileobj=self.file, mode='w', format=tarfile.GNU_FORMAT, encoding='utf-8')
+        # 归档中的路径 -> 索引记录
+        self.entries = {}
+        # 写入过程中的第一个异常，之后归档已不完整，close() 时放弃
+        self.error = None
+        self.closed = False
+
+    def add(self, name, data=None, source=None, size=None, date_time=None, **record):
+        """写入一个文件：data 为内容，或 source 为可读取 size 字节的文件对象（流式复制，不整个读入内存）
+
+        date_time 为 ZIP 格式的 (年, 月, 日, 时, 分, 秒)，record 为索引中的其他字段，返回索引记录。
+        """
+        if data is not None:
+            size = len(data)
+            source = io.BytesIO(data)
+        date_time = date_time or datetime.now().timetuple()[:6]
+        hasher = new_hasher(self.hash_algorithm)
+        try:
+            offset = self.write_member(name, source, size, date_time, hasher)
+        except BaseException as e:
+            self.error = self.error or e
+            raise
+        entry = dict.fromkeys(INDEX_FIELDS, '')
+        entry.update(record, path=name, digest=hasher.hexdigest(), offset=offset, size=size)
+        self.entries[name] = entry
+        return entry
+
+    def write_member(self, name, source, size, date_time, hasher):
+        """写入一个成员，返回内容在归档文件中的偏移"""
+        if self.format == 'zip':
+            info = zipfile.ZipInfo(name, date_time)
+            info.compress_type = zipfile.ZIP_STORED
+            info.file_size = size
+            with self.archive.open(info, 'w') as dst:
+                offset = self.file.tell()
+                copy_hashed(source, dst, hasher)
+            return offset
+        info = tarfile.TarInfo(name)
+        info.size = size
+        info.mtime = int(datetime(*date_time).timestamp())
+        self.archive.addfile(info, HashingReader(source, hasher))
+        # addfile 之后位置在内容（补齐到512字节的整数倍）之后
+        return self.archive.offset - (size + tarfile.BLOCKSIZE - 1) // tarfile.BLOCKSIZE * tarfile.BLOCKSIZE
+
+    def write_index(self):
+        """索引逐条写到临时文件（较大时在磁盘上）再复制进归档，不在内存中拼出整个索引"""
+        records = list(self.entries.values())
+        with tempfile.SpooledTemporaryFile(INDEX_SPOOL_SIZE) as buffer:
+            text = io.TextIOWrapper(buffer, encoding='utf-8', newline='')
+            text.write('[\n')
+            for i, record in enumerate(records):
+                text.write(('' if i == 0 else ',\n') + json.dumps(record, ensure_ascii=False))
+            text.write('\n]\n')
+            self.add_buffer(f"{INDEX_NAME}.json", text)
+        with tempfile.SpooledTemporaryFile(INDEX_SPOOL_SIZE) as buffer:
+            # 带BOM，Excel 打开时能正确识别UTF-8
+            text = io.TextIOWrapper(buffer, encoding='utf-8-sig', newline='')
+            writer = csv.DictWriter(text, INDEX_FIELDS)
+            writer.writeheader()
+            writer.writerows(records)
+            self.add_buffer(f"{INDEX_NAME}.csv", text)
+
+    def add_buffer(self, name, text):
+        text.flush()
+        buffer = text.detach()
+        size = buffer.tell()
+        buffer.seek(0)
+        self.add(name, source=buffer, size=size)
+
+    def close(self):
+        """写入索引，结束归档并替换为正式文件；写入过程中出过错时删除临时文件并重新抛出"""
+        if self.closed:
+            return
+        if self.error is not None:
+            self.abort()
+            raise self.error
+        try:
+            self.write_index()
+            self.archive.close()
+        except BaseException:
+            self.abort()
+            raise
+        self.closed = True
+        self.file.close()
+        os.replace(self.part_path, self.path)
+
+    def abort(self):
+        """出错时放弃归档，删除临时文件"""
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            # 先结束 ZipFile / TarFile，回收时就不会再向已关闭的文件写结束记录
+            self.archive.close()
+        except Exception:
+            pass
+        try:
+            self.file.close()
+        finally:
+            os.remove(self.part_path)
+
+    @property
+    def size(self):
+        return self.file.tell()
+
+
+class HashingReader:
+    """读取时顺便计算摘要的文件对象包装（tarfile 从中按块读取内容）"""
+
+    def __init__(self, source, hasher):
+        self.source = source
+        self.hasher = hasher
+
+    def read(self, size=-1):
+        data = self.source.read(size)
+        self.hasher.update(data)
+        return data
+
+
+def copy_hashed(source, dst, hasher):
+    while True:
+        chunk = source.read(HASH_BUFFER_SIZE)
+        if not chunk:
+            break
+        hasher.update(chunk)
+        dst.write(chunk)
+
+
+def load_archive_index(path):
+    """读取归档中的索引（索引.json），返回记录列表"""
+    name = f"{INDEX_NAME}.json"
+    if zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as archive:
+            return json.loads(archive.read(name).decode('utf-8'))
+    with tarfile.open(path, 'r:') as archive:
+        return json.loads(archive.extractfile(name).read().decode('utf-8'))
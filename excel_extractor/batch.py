@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+"""
+批量提取
+功能：对一个目录或通配符匹配到的所有Excel文件，在进程池中并行执行提取，
+每个文件输出到各自的子目录，最后汇总统计。单个文件出错不会中断整个批次。
+"""
+
+import os
+import glob
+import time
+import logging
+from dataclasses import dataclass, field, replace
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from .engine import ExtractionOptions, extract
+
+logger = logging.getLogger(__name__)
+
+# 批量模式下处理的文件扩展名
+WORKBOOK_EXTENSIONS = ('.xlsx', '.xlsm')
+
+
+@dataclass
+class BatchReport:
+    """一次批量提取的汇总结果"""
+    output_dir: str
+    reports: list = field(default_factory=list)  # 成功文件的 ExtractionReport，按输入顺序
+    failures: list = field(default_factory=list)  # (文件路径, 错误信息)
+    wall_time: float = 0.0
+
+    @property
+    def file_count(self):
+        return len(self.reports) + len(self.failures)
+
+    @property
+    def extracted_count(self):
+        return sum(r.extracted_count for r in self.reports)
+
+    @property
+    def unique_count(self):
+        return sum(r.unique_count for r in self.reports)
+
+    @property
+    def duplicate_count(self):
+        return sum(r.duplicate_count for r in self.reports)
+
+    @property
+    def merged_count(self):
+        return sum(r.merged_count for r in self.reports)
+
+
+def is_batch_target(target):
+    """判断输入是目录或通配符（而不是单个文件）"""
+    return os.path.isdir(target) or glob.has_magic(target)
+
+
+def collect_workbooks(target):
+    """收集目录（递归）或通配符匹配到的Excel文件，按路径排序"""
+    if os.path.isdir(target):
+        pattern = os.path.join(target, "**", "*")
+    else:
+        pattern = target
+    workbooks = []
+    for path in glob.glob(pattern, recursive=True):
+        name = os.path.basename(path)
+        # 跳过Excel打开文件时生成的 ~$ 锁文件
+        if name.startswith("~$") or not name.lower().endswith(WORKBOOK_EXTENSIONS):
+            continue
+        if os.path.isfile(path):
+            workbooks.append(path)
+    return sorted(workbooks)
+
+
+def plan_output_dirs(workbooks, output_dir):
+    """为每个Excel文件分配独立的输出子目录，同名文件追加序号避免冲突"""
+    planned = {}
+    used = set()
+    for path in workbooks:
+        stem = os.path.splitext(os.path.basename(path))[0]
+        name = stem
+        counter = 1
+        while name.lower() in used:
+            name = f"{stem}_{counter}"
+            counter += 1
+        used.add(name.lower())
+        planned[path] = os.path.join(output_dir, name)
+    return planned
+
+
+def workbook_options(options, output_dir):
+    """每个文件的提取选项：指标文件和性能分析文件名加上输出子目录名，各文件分别保存，不互相覆盖"""
+    name = os.path.basename(output_dir)
+    changes = {}
+    for key in ('metrics_file', 'profile_file'):
+        path = getattr(options, key)
+        if path:
+            root, ext = os.path.splitext(path)
+            changes[key] = f"{root}_{name}{ext}"
+    return replace(options, **changes) if changes else options
+
+
+def _init_worker(log_level):
+    """子进程初始化：使用与主进程一致的日志级别"""
+    logging.basicConfig(level=logging.WARNING,
+                        format="[%(asctime)s] [%(processName)s] %(message)s",
+                        datefmt="%Y-%m-%d %H:%M:%S")
+    logging.getLogger("excel_extractor").setLevel(log_level)
+
+
+def _extract_one(excel_file, output_dir, options):
+    """在子进程中提取单个文件，出错时返回错误信息而不是抛出"""
+    try:
+        return extract(excel_file, output_dir, options), None
+    except Exception as e:
+        return None, f"{type(e).__name__}: {str(e)}"
+
+
+def run_batch(workbooks, output_dir, options=None, workers=None, log_level=logging.WARNING):
+    """在进程池中批量提取 workbooks，返回 BatchReport
+
+    workers 为进程数，默认等于CPU核心数。
+    """
+    options = options or ExtractionOptions()
+    batch = BatchReport(output_dir=output_dir)
+    planned = plan_output_dirs(workbooks, output_dir)
+    results = {}
+    start = time.perf_counter()
+
+    logger.info(f"开始批量提取 {len(workbooks)} 个文件，进程数: {workers or os.cpu_count()}")
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(log_level,)) as executor:
+        futures = {executor.submit(_extract_one, path, planned[path], workbook_options(options, planned[path])): path
+                   for path in workbooks}
+        for done, future in enumerate(as_completed(futures), 1):
+            path = futures[future]
+            try:
+                report, error = future.result()
+            except Exception as e:
+                # 子进程异常退出等情况
+                report, error = None, f"{type(e).__name__}: {str(e)}"
+            results[path] = (report, error)
+            if error:
+                logger.error(f"[{done}/{len(workbooks)}] 提取失败: {path}: {error}")
+            else:
+                logger.info(f"[{done}/{len(workbooks)}] 提取完成: {path} ({report.extracted_count} 个图片)")
+
+    for path in workbooks:
+        report, error = results[path]
+        if error:
+            batch.failures.append((path, error))
+        else:
+            batch.reports.append(report)
+    batch.wall_time = time.perf_counter() - start
+    return batch
@@ -0,0 +1,338 @@
+# -*- coding: utf-8 -*-
+"""
+性能基准
+功能：用 zipfile 直接写出 OOXML 部件，生成可配置的合成Excel文件（工作表数、每个工作表的锚点数、
+组合大小、重复比例、图片尺寸），然后在独立进程中运行提取引擎，记录各阶段耗时、吞吐量和峰值内存，
+追加到JSON Lines格式的历史文件中，并与历史中相同参数的上一次结果比较，便于发现性能退化。
+
+用法：python -m excel_extractor.benchmark [--sheets 4] [--anchors 50] [--group-size 3] ...
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+import zipfile
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass
+from datetime import datetime
+
+from .engine import ExtractionOptions, extract
+from .hashing import DEFAULT_HASH_ALGORITHM, HASH_ALGORITHMS
+from .metrics import format_bytes, peak_rss
+
+DEFAULT_HISTORY = "benchmark_history.jsonl"
+EMU_PER_PIXEL = 9525
+
+CONTENT_TYPES_NS = 'http://schemas.openxmlformats.org/package/2006/content-types'
+RELS_NS = 'http://schemas.openxmlformats.org/package/2006/relationships'
+MAIN_NS = 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'
+DOC_REL_NS = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+XDR_NS = 'http://schemas.openxmlformats.org/drawingml/2006/spreadsheetDrawing'
+A_NS = 'http://schemas.openxmlformats.org/drawingml/2006/main'
+REL_TYPE = DOC_REL_NS + '/'
+
+
+@dataclass
+class WorkbookSpec:
+    """合成Excel文件的参数"""
+    sheets: int = 4
+    anchors: int = 50  # 每个工作表的锚点数
+    group_size: int = 3  # 每个组合锚点包含的图片数，1 为全部是单独图片
+    group_ratio: float = 0.5  # 组合锚点所占比例
+    duplicate_ratio: float = 0.2  # 内容与之前某张图片完全相同的图片比例（不同成员，相同字节）
+    image_width: int = 200
+    image_height: int = 150
+    seed: int = 0
+
+
+def png_bytes(width, height, rng):
+    """不依赖Pillow编码一张RGB PNG：每行是同一段随机像素循环移位，内容唯一且编码很快"""
+    base = bytes(rng.getrandbits(8) for _ in range(width * 3))
+    shift = 3 * rng.randrange(1, width + 1)
+    rows = []
+    for y in range(height):
+        offset = (y * shift) % len(base)
+        rows.append(b'\x00' + base[offset:] + base[:offset])
+
+    def chunk(tag, data):
+        return struct.pack('>I', len(data)) + tag + data + struct.pack('>I', zlib.crc32(tag + data))
+
+    header = struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)
+    return (b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', header)
+            + chunk(b'IDAT', zlib.compress(b''.join(rows), 1)) + chunk(b'IEND', b''))
+
+
+def relationships(entries):
+    """[(关系ID, 类型后缀, 目标), ...] -> 关系文件XML"""
+    return (f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n<Relationships xmlns="{RELS_NS}">'
+            + ''.join(f'<Relationship Id="{rel_id}" Type="{REL_TYPE}{rel_type}" Target="{target}"/>'
+                      for rel_id, rel_type, target in entries)
+            + '</Relationships>')
+
+
+def picture_xml(pic_id, rel_id, x, y, width, height):
+    return (f'<xdr:pic><xdr:nvPicPr><xdr:cNvPr id="{pic_id}" name="图片 {pic_id}"/><xdr:cNvPicPr/></xdr:nvPicPr>'
+            f'<xdr:blipFill><a:blip r:embed="{rel_id}"/><a:stretch><a:fillRect/></a:stretch></xdr:blipFill>'
+            f'<xdr:spPr><a:xfrm><a:off x="{x}" y="{y}"/><a:ext cx="{width}" cy="{height}"/></a:xfrm>'
+            f'<a:prstGeom prst="rect"><a:avLst/></a:prstGeom></xdr:spPr></xdr:pic>')
+
+
+def anchor_xml(row, col, body):
+    return (f'<xdr:twoCellAnchor editAs="oneCell">'
+            f'<xdr:from><xdr:col>{col}</xdr:col><xdr:colOff>0</xdr:colOff>'
+            f'<xdr:row>{row}</xdr:row><xdr:rowOff>0</xdr:rowOff></xdr:from>'
+            f'<xdr:to><xdr:col>{col + 2}</xdr:col><xdr:colOff>0</xdr:colOff>'
+            f'<xdr:row>{row + 8}</xdr:row><xdr:rowOff>0</xdr:rowOff></xdr:to>'
+            f'{body}<xdr:clientData/></xdr:twoCellAnchor>')
+
+
+def generate_workbook(path, spec):
+    """按 spec 生成合成Excel文件，返回图片成员数"""
+    rng = random.Random(spec.seed)
+    width_emu, height_emu = spec.image_width * EMU_PER_PIXEL, spec.image_height * EMU_PER_PIXEL
+    group_count = round(spec.anchors * spec.group_ratio) if spec.group_size > 1 else 0
+    unique_images = []
+    image_number = 0
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr('_rels/.rels', relationships([('rId1', 'officeDocument', 'xl/workbook.xml')]))
+        zf.writestr('xl/workbook.xml',
+                    f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+                    f'<workbook xmlns="{MAIN_NS}" xmlns:r="{DOC_REL_NS}"><sheets>'
+                    + ''.join(f'<sheet name="Sheet{i + 1}" sheetId="{i + 1}" r:id="rId{i + 1}"/>'
+                              for i in range(spec.sheets))
+                    + '</sheets></workbook>')
+        zf.writestr('xl/_rels/workbook.xml.rels', relationships(
+            [(f'rId{i + 1}', 'worksheet', f'worksheets/sheet{i + 1}.xml') for i in range(spec.sheets)]))
+
+        for sheet in range(1, spec.sheets + 1):
+            zf.writestr(f'xl/worksheets/sheet{sheet}.xml',
+                        f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+                        f'<worksheet xmlns="{MAIN_NS}" xmlns:r="{DOC_REL_NS}"><sheetData/>'
+                        f'<drawing r:id="rId1"/></worksheet>')
+            zf.writestr(f'xl/worksheets/_rels/sheet{sheet}.xml.rels', relationships(
+                [('rId1', 'drawing', f'../drawings/drawing{sheet}.xml')]))
+
+            drawing_rels = []
+            anchors = []
+            pic_id = 1
+            for anchor in range(spec.anchors):
+                row, col = (anchor // 5) * 10, (anchor % 5) * 3
+                size = spec.group_size if anchor < group_count else 1
+                pictures = []
+                for i in range(size):
+                    image_number += 1
+                    if unique_images and rng.random() < spec.duplicate_ratio:
+                        data = rng.choice(unique_images)
+                    else:
+                        data = png_bytes(spec.image_width, spec.image_height, rng)
+                        unique_images.append(data)
+                    zf.writestr(f'xl/media/image{image_number}.png', data)
+                    rel_id = f'rId{len(drawing_rels) + 1}'
+                    drawing_rels.append((rel_id, 'image', f'../media/image{image_number}.png'))
+                    pic_id += 1
+                    pictures.append(picture_xml(pic_id, rel_id, i * width_emu, 0, width_emu, height_emu))
+                if size == 1:
+                    anchors.append(anchor_xml(row, col, pictures[0]))
+                else:
+                    pic_id += 1
+                    anchors.append(anchor_xml(row, col, (
+                        f'<xdr:grpSp><xdr:nvGrpSpPr><xdr:cNvPr id="{pic_id}" name="组合 {pic_id}"/>'
+                        f'<xdr:cNvGrpSpPr/></xdr:nvGrpSpPr><xdr:grpSpPr><a:xfrm>'
+                        f'<a:off x="0" y="0"/><a:ext cx="{size * width_emu}" cy="{height_emu}"/>'
+                        f'<a:chOff x="0" y="0"/><a:chExt cx="{size * width_emu}" cy="{height_emu}"/>'
+                        f'</a:xfrm></xdr:grpSpPr>{"".join(pictures)}</xdr:grpSp>')))
+            zf.writestr(f'xl/drawings/drawing{sheet}.xml',
+                        f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+                        f'<xdr:wsDr xmlns:xdr="{XDR_NS}" xmlns:a="{A_NS}" xmlns:r="{DOC_REL_NS}">'
+                        + ''.join(anchors) + '</xdr:wsDr>')
+            zf.writestr(f'xl/drawings/_rels/drawing{sheet}.xml.rels', relationships(drawing_rels))
+
+        zf.writestr('[Content_Types].xml',
+                    f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n<Types xmlns="{CONTENT_TYPES_NS}">'
+                    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+                    '<Default Extension="xml" ContentType="application/xml"/>'
+                    '<Default Extension="png" ContentType="image/png"/>'
+                    '<Override PartName="/xl/workbook.xml" ContentType="application/'
+                    'vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+                    + ''.join(f'<Override PartName="/xl/worksheets/sheet{i + 1}.xml" ContentType="application/'
+                              f'vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+                              f'<Override PartName="/xl/drawings/drawing{i + 1}.xml" ContentType="application/'
+                              f'vnd.openxmlformats-officedocument.drawing+xml"/>' for i in range(spec.sheets))
+                    + '</Types>')
+    return image_number
+
+
+def run_once(excel_file, output_dir, options):
+    """在独立进程中运行一次提取，返回该次的指标（峰值内存只包含本次运行）"""
+    start = time.perf_counter()
+    report = extract(excel_file, output_dir, options)
+    wall_time = time.perf_counter() - start
+    with zipfile.ZipFile(excel_file) as zf:
+        media_bytes = sum(info.file_size for info in zf.infolist() if info.filename.startswith('xl/media/'))
+    return {
+        'wall_time': wall_time,
+        'phases': report.phase_times,
+        'phase_stats': {name: stats.to_dict() for name, stats in report.phases.items()},
+        'images': report.extracted_count,
+        'images_per_sec': report.extracted_count / wall_time if wall_time else None,
+        'media_bytes_per_sec': media_bytes / wall_time if wall_time else None,
+        'merged': report.merged_count,
+        'duplicates': report.duplicate_count,
+        'peak_rss': peak_rss(),
+    }
+
+
+def git_revision():
+    """当前代码的git提交（不在git仓库中时为None）"""
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmark(excel_file, options, repeat=3):
+    """运行 repeat 次（每次使用新的输出目录和新的进程），返回每次的指标"""
+    runs = []
+    for _ in range(repeat):
+        output_dir = tempfile.mkdtemp(prefix='excel_extractor_bench_')
+        try:
+            with ProcessPoolExecutor(max_workers=1) as pool:
+                runs.append(pool.submit(run_once, excel_file, output_dir, options).result())
+        finally:
+            shutil.rmtree(output_dir, ignore_errors=True)
+    return runs
+
+
+def summarize(runs):
+    """取各次运行的中位数"""
+    def median(values):
+        values = sorted(value for value in values if value is not None)
+        return values[len(values) // 2] if values else None
+
+    # 保持各阶段的执行顺序
+    phases = list(dict.fromkeys(name for run in runs for name in run['phases']))
+    return {
+        'wall_time': median(run['wall_time'] for run in runs),
+        'phases': {name: median(run['phases'].get(name, 0.0) for run in runs) for name in phases},
+        'images': runs[0]['images'],
+        'images_per_sec': median(run['images_per_sec'] for run in runs),
+        'media_bytes_per_sec': median(run['media_bytes_per_sec'] for run in runs),
+        'peak_rss': median(run['peak_rss'] for run in runs),
+    }
+
+
+def load_history(path):
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def append_history(path, record):
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="excel_extractor.benchmark",
+        description="生成合成Excel文件并测量提取引擎各阶段的耗时、吞吐量和峰值内存")
+    spec = WorkbookSpec()
+    parser.add_argument("--workbook", default=None,
+                        help="使用已有的Excel文件，不生成合成文件（此时忽略工作簿参数）")
+    parser.add_argument("--sheets", type=int, default=spec.sheets, help=f"工作表数（默认 {spec.sheets}）")
+    parser.add_argument("--anchors", type=int, default=spec.anchors,
+                        help=f"每个工作表的锚点数（默认 {spec.anchors}）")
+    parser.add_argument("--group-size", type=int, default=spec.group_size,
+                        help=f"组合锚点包含的图片数（默认 {spec.group_size}）")
+    parser.add_argument("--group-ratio", type=float, default=spec.group_ratio,
+                        help=f"组合锚点所占比例（默认 {spec.group_ratio}）")
+    parser.add_argument("--duplicate-ratio", type=float, default=spec.duplicate_ratio,
+                        help=f"重复图片比例（默认 {spec.duplicate_ratio}）")
+    parser.add_argument("--image-size", default=f"{spec.image_width}x{spec.image_height}",
+                        help=f"图片尺寸 宽x高（默认 {spec.image_width}x{spec.image_height}）")
+    parser.add_argument("--seed", type=int, default=spec.seed, help="随机种子")
+    parser.add_argument("--keep", default=None, help="把生成的Excel文件保存到此路径")
+    parser.add_argument("--repeat", type=int, default=3, help="运行次数，结果取中位数（默认 3）")
+    parser.add_argument("--no-merge", dest="merge", action="store_false", help="不合并图片")
+    parser.add_argument("--hash", dest="hash_algorithm", default=DEFAULT_HASH_ALGORITHM, choices=HASH_ALGORITHMS,
+                        help=f"摘要算法（默认 {DEFAULT_HASH_ALGORITHM}）")
+    parser.add_argument("--history", default=DEFAULT_HISTORY,
+                        help=f"历史记录文件（JSON Lines，默认 {DEFAULT_HISTORY}）")
+    return parser
+
+
+def print_result(result, previous=None):
+    print(f"图片数: {result['images']}")
+    print(f"总耗时: {result['wall_time']:.3f} 秒" + change(result['wall_time'], previous, 'wall_time'))
+    for name, seconds in result['phases'].items():
+        previous_phases = (previous or {}).get('phases', {})
+        print(f"  {name:<10} {seconds:.3f} 秒" + change(seconds, previous_phases, name))
+    print(f"吞吐量: {result['images_per_sec']:.1f} 张/秒，{format_bytes(result['media_bytes_per_sec'])}/秒")
+    if result['peak_rss'] is not None:
+        print(f"峰值内存: {format_bytes(result['peak_rss'])}" + change(result['peak_rss'], previous, 'peak_rss'))
+
+
+def change(value, previous, key):
+    """与历史中相同参数的上一次结果比较，返回变化百分比"""
+    if not previous or not previous.get(key) or value is None:
+        return ""
+    return f"（较上次 {(value / previous[key] - 1) * 100:+.1f}%）"
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    width, height = (int(value) for value in args.image_size.lower().split('x'))
+    spec = WorkbookSpec(args.sheets, args.anchors, args.group_size, args.group_ratio,
+                        args.duplicate_ratio, width, height, args.seed)
+    options = ExtractionOptions(merge=args.merge, hash_algorithm=args.hash_algorithm)
+
+    temp_dir = None
+    if args.workbook:
+        excel_file = args.workbook
+        params = {'workbook': os.path.abspath(excel_file)}
+    else:
+        temp_dir = tempfile.mkdtemp(prefix='excel_extractor_bench_')
+        excel_file = args.keep or os.path.join(temp_dir, 'benchmark.xlsx')
+        start = time.perf_counter()
+        count = generate_workbook(excel_file, spec)
+        print(f"生成合成Excel文件: {count} 张图片，{format_bytes(os.path.getsize(excel_file))}，"
+              f"耗时 {time.perf_counter() - start:.2f} 秒")
+        params = asdict(spec)
+    params.update(merge=options.merge, hash_algorithm=options.hash_algorithm)
+
+    try:
+        runs = run_benchmark(excel_file, options, args.repeat)
+    finally:
+        if temp_dir:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+    result = summarize(runs)
+    previous = next((record['result'] for record in reversed(load_history(args.history))
+                     if record.get('params') == params), None)
+    print_result(result, previous)
+    append_history(args.history, {
+        'time': datetime.now().isoformat(timespec='seconds'),
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'params': params,
+        'result': result,
+        'runs': runs,
+    })
+    print(f"结果已追加到 {args.history}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+"""
+命令行入口
+用法：python -m excel_extractor 文件.xlsx [-o 输出目录] [--no-merge] [--log-level INFO]
+批量：python -m excel_extractor 目录或通配符 [-o 输出目录] [-j 进程数]
+"""
+
+import argparse
+import logging
+import os
+import sys
+
+from .archive import ARCHIVE_FORMATS
+from .batch import collect_workbooks, is_batch_target, run_batch
+from .engine import ExtractionOptions, extract
+from .hashing import DEFAULT_HASH_ALGORITHM, HASH_ALGORITHMS
+from .layout import DEFAULT_COLUMNS, LAYOUT_MODES
+from .merge import DEFAULT_JPEG_QUALITY, MERGE_EXECUTORS, MERGE_FORMATS
+from .metrics import format_bytes
+from .perceptual import DEFAULT_NEAR_THRESHOLD, PERCEPTUAL_METHODS
+from .pipeline import DEFAULT_WRITE_WORKERS
+from .store import LINK_MODES
+from .thumbnails import parse_sizes
+
+
+def build_parser():
+    """构建命令行参数解析器"""
+    parser = argparse.ArgumentParser(
+        prog="excel_extractor",
+        description="从Excel文件中提取图片，按单元格地址创建目录保存")
+    parser.add_argument("excel_file",
+                        help="要处理的Excel文件（.xlsx）；传入目录或通配符时进入批量模式")
+    parser.add_argument("-o", "--output-dir", default=os.getcwd(),
+                        help="输出目录（默认为当前目录）")
+    parser.add_argument("--merge", dest="merge", action="store_true", default=True,
+                        help="提取后合并每个目录的图片（默认开启，需要Pillow库）")
+    parser.add_argument("--no-merge", dest="merge", action="store_false",
+                        help="只提取，不合并图片")
+    parser.add_argument("--log-level", default="INFO",
+                        choices=["DEBUG", "INFO", "WARNING", "ERROR"],
+                        help="日志级别（默认 INFO）")
+    parser.add_argument("--hash", dest="hash_algorithm", default=DEFAULT_HASH_ALGORITHM,
+                        choices=HASH_ALGORITHMS,
+                        help=f"重复检测的摘要算法（默认 {DEFAULT_HASH_ALGORITHM}，xxh3 需要xxhash库）")
+    parser.add_argument("--link", dest="link_mode", default="copy", choices=LINK_MODES,
+                        help="重复图片的输出方式：copy 每个位置写独立副本（默认）；"
+                             "其他方式只在'图片存储'目录保存一份，单元格目录中放链接")
+    parser.add_argument("--write-workers", type=int, default=DEFAULT_WRITE_WORKERS,
+                        help=f"写出图片的线程数（默认 {DEFAULT_WRITE_WORKERS}），输出目录在网络文件系统上时可以适当增大")
+    parser.add_argument("--merge-workers", type=int, default=None,
+                        help="合并阶段的并行数（默认为CPU核心数，1 为顺序执行）")
+    parser.add_argument("--merge-executor", default="thread", choices=MERGE_EXECUTORS,
+                        help="合并阶段使用线程池（thread，默认）或进程池（process）")
+    parser.add_argument("--merge-max-pixels", type=int, default=None,
+                        help="合并图片的最大像素数，超过时按比例缩小（默认不限制）")
+    parser.add_argument("--merge-layout", default="horizontal", choices=LAYOUT_MODES,
+                        help="合并图片的排列方式：horizontal 横向一行（默认）、vertical 纵向一列、grid 网格、"
+                             "columns 固定列数、pack 装箱、anchor 按工作表上的位置原样排列")
+    parser.add_argument("--merge-columns", type=int, default=None,
+                        help=f"--merge-layout columns 的列数（默认 {DEFAULT_COLUMNS}）")
+    parser.add_argument("--merge-format", default="png", choices=MERGE_FORMATS,
+                        help="合并图片的保存格式：png（默认）、webp（无损）、jpeg（仅全部为JPEG的目录）、"
+                             "source（保持来源格式）")
+    parser.add_argument("--png-compress-level", type=int, default=None, choices=range(10), metavar="0-9",
+                        help="PNG压缩级别，越小越快、文件越大（默认 6）")
+    parser.add_argument("--jpeg-quality", type=int, default=DEFAULT_JPEG_QUALITY,
+                        help=f"合并为JPEG时的质量 1-95（默认 {DEFAULT_JPEG_QUALITY}）")
+    parser.add_argument("--incremental", action="store_true",
+                        help="增量提取：根据输出目录中的清单只写出有变化的图片和合并，删除已不存在的输出")
+    parser.add_argument("--near-dup", dest="near_duplicates", default=None, choices=PERCEPTUAL_METHODS,
+                        help="同时检测近似重复图片（感知哈希，需要Pillow和NumPy库），按'_副本'规则命名")
+    parser.add_argument("--near-threshold", type=int, default=DEFAULT_NEAR_THRESHOLD,
+                        help=f"近似重复的汉明距离阈值（64位哈希，默认 {DEFAULT_NEAR_THRESHOLD}）")
+    parser.add_argument("--thumbnails", dest="thumbnail_sizes", type=parse_sizes, default=(),
+                        metavar="256[,1024...]",
+                        help="同时生成缩略图（最大边长，可用逗号分隔多个尺寸，需要Pillow库），"
+                             "保存到'缩略图'目录；与近似重复检测、合并共用同一次解码")
+    parser.add_argument("--sheet", dest="sheets", action="append", default=[], metavar="工作表",
+                        help="只提取此工作表中的图片（可重复指定）")
+    parser.add_argument("--range", dest="ranges", action="append", default=[], metavar="[工作表!]区域",
+                        help="只提取与此区域相交的图片，如 Sheet2!B2:B5000、B:D（可重复指定，"
+                             "不带工作表名时适用于所有工作表）；不在范围内的图片不会被解压")
+    parser.add_argument("--archive", default=None, choices=ARCHIVE_FORMATS,
+                        help="把提取结果和合并结果写入输出目录中的一个不压缩的归档（图片.zip / 图片.tar，"
+                             "内含索引.json、索引.csv），代替每个单元格一个目录")
+    parser.add_argument("--metrics-file", default=None,
+                        help="把各阶段的耗时、CPU时间、读写字节数、图片数和峰值内存写成 Prometheus 文本文件")
+    parser.add_argument("--profile", dest="profile_file", default=None,
+                        help="用 cProfile 分析提取过程，结果保存到此文件（python -m pstats 文件 查看）")
+    parser.add_argument("-j", "--workers", type=int, default=None,
+                        help="批量模式的进程数（默认为CPU核心数）")
+    return parser
+
+
+def configure_logging(level, fmt="[%(asctime)s] %(message)s"):
+    """只对本工具的日志应用所选级别，第三方库（如Pillow）保持 WARNING"""
+    logging.basicConfig(level=logging.WARNING, format=fmt, datefmt="%Y-%m-%d %H:%M:%S")
+    logging.getLogger("excel_extractor").setLevel(level)
+
+
+def main(argv=None):
+    """命令行主函数，返回进程退出码"""
+    args = build_parser().parse_args(argv)
+    configure_logging(args.log_level)
+
+    options = ExtractionOptions(merge=args.merge, hash_algorithm=args.hash_algorithm,
+                                link_mode=args.link_mode, write_workers=args.write_workers,
+                                merge_workers=args.merge_workers,
+                                merge_executor=args.merge_executor, merge_max_pixels=args.merge_max_pixels,
+                                merge_layout=args.merge_layout, merge_columns=args.merge_columns,
+                                merge_format=args.merge_format, png_compress_level=args.png_compress_level,
+                                jpeg_quality=args.jpeg_quality, incremental=args.incremental,
+                                near_duplicates=args.near_duplicates, near_threshold=args.near_threshold,
+                                thumbnail_sizes=args.thumbnail_sizes, sheets=tuple(args.sheets),
+                                ranges=tuple(args.ranges), archive=args.archive, metrics_file=args.metrics_file,
+                                profile_file=args.profile_file)
+    if is_batch_target(args.excel_file):
+        return run_batch_command(args, options)
+
+    try:
+        report = extract(args.excel_file, args.output_dir, options)
+    except Exception as e:
+        logging.getLogger(__name__).error(f"提取过程中发生错误: {str(e)}")
+        return 1
+
+    print(f"共提取 {report.extracted_count} 个图片文件")
+    print(f"组合图片组数: {len(report.groups)}")
+    if options.merge and not report.merge_skipped:
+        print(f"合并图片数: {report.merged_count}")
+    print(f"唯一图片数: {report.unique_count}")
+    print(f"重复图片数: {report.duplicate_count}")
+    if options.near_duplicates:
+        print(f"近似重复图片数: {len(report.near_duplicates)}")
+    if options.thumbnail_sizes and not report.thumbnail_skipped:
+        print(f"缩略图数: {report.thumbnail_count}")
+    if report.archive_path:
+        print(f"归档: {report.archive_path}")
+    if options.incremental:
+        print(f"未变化跳过: 图片 {report.unchanged_count}，合并 {report.unchanged_merge_count}")
+        print(f"删除过期文件: {report.removed_count}")
+    if report.peak_rss is not None:
+        print(f"峰值内存: {format_bytes(report.peak_rss)}")
+    if report.merge_skipped:
+        print("注意: 未安装Pillow库，无法进行图片合并", file=sys.stderr)
+    if report.thumbnail_skipped:
+        print("注意: 未安装Pillow库，无法生成缩略图", file=sys.stderr)
+    return 0
+
+
+def run_batch_command(args, options):
+    """批量模式：每个文件输出到 输出目录/<文件名>/ 下"""
+    workbooks = collect_workbooks(args.excel_file)
+    if not workbooks:
+        print(f"未找到Excel文件: {args.excel_file}", file=sys.stderr)
+        return 1
+
+    batch = run_batch(workbooks, args.output_dir, options,
+                      workers=args.workers, log_level=args.log_level)
+
+    print(f"文件数: {batch.file_count}（成功 {len(batch.reports)}，失败 {len(batch.failures)}）")
+    print(f"共提取 {batch.extracted_count} 个图片文件")
+    if options.merge:
+        print(f"合并图片数: {batch.merged_count}")
+    print(f"唯一图片数: {batch.unique_count}")
+    print(f"重复图片数: {batch.duplicate_count}")
+    print(f"总耗时: {batch.wall_time:.2f} 秒")
+    for path, error in batch.failures:
+        print(f"失败: {path}: {error}", file=sys.stderr)
+    return 1 if batch.failures else 0
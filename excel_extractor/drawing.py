@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+"""
+绘图XML流式解析
+功能：用 iterparse 逐个读取 drawingN.xml 中的锚点（oneCellAnchor / twoCellAnchor），
+每个锚点生成一条紧凑的位置记录，处理完立即释放对应的XML元素，内存占用与绘图大小无关。
+picture_bounds 把锚点和图片自身的 a:xfrm 换算为图片在工作表上的位置，供按原样排列的合并使用。
+"""
+
+import logging
+from collections import namedtuple
+import xml.etree.ElementTree as ET
+
+logger = logging.getLogger(__name__)
+
+# Excel绘图XML的命名空间
+XDR_NS = '{http://schemas.openxmlformats.org/drawingml/2006/spreadsheetDrawing}'
+A_NS = '{http://schemas.openxmlformats.org/drawingml/2006/main}'
+R_NS = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}'
+
+ANCHOR_TAGS = (XDR_NS + 'oneCellAnchor', XDR_NS + 'twoCellAnchor')
+
+# 没有 a:xfrm 时按默认列宽（64像素）和行高（20像素）由单元格估算位置，1像素 = 9525 EMU
+DEFAULT_COLUMN_WIDTH_EMU = 609600
+DEFAULT_ROW_HEIGHT_EMU = 190500
+
+# 单元格标记：列号、行号（均从0开始）及单元格内偏移（EMU）
+Marker = namedtuple('Marker', 'col row col_off row_off')
+# 锚点中的一张图片：embed_id 为关系ID（没有 a:blip 时为None，有 a:blip 但无 r:embed 时为空字符串），
+# off / ext 为图片自身 a:xfrm 中的位置和尺寸（组合内为组合坐标系），缺失时为None
+Picture = namedtuple('Picture', 'embed_id off ext')
+# 组合的变换：组合在工作表上的位置尺寸，以及组合内子坐标系的原点和尺寸（a:off / a:ext / a:chOff / a:chExt）
+GroupTransform = namedtuple('GroupTransform', 'off ext ch_off ch_ext')
+# 一个锚点：起止单元格（oneCellAnchor 没有 to）、是否组合、包含的图片、组合的变换（非组合或缺失时为None）
+Anchor = namedtuple('Anchor', 'from_marker to_marker is_group pictures group_transform')
+
+
+def iter_anchors(source):
+    """流式解析绘图XML，依次生成 Anchor 记录
+
+    source 为文件路径或文件对象（例如 ZipFile.open() 返回的成员）。
+    坐标无法解析的锚点记录日志后跳过。
+    """
+    root = None
+    for event, elem in ET.iterparse(source, events=('start', 'end')):
+        if event == 'start':
+            if root is None:
+                root = elem
+            continue
+        if elem.tag not in ANCHOR_TAGS:
+            continue
+        try:
+            anchor = parse_anchor(elem)
+        except (ValueError, TypeError) as e:
+            logger.error(f"解析位置坐标时出错: {str(e)}")
+            anchor = None
+        # 释放已处理的元素，保持内存占用平稳
+        elem.clear()
+        del root[:]
+        if anchor is not None:
+            yield anchor
+
+
+def parse_anchor(anchor):
+    """把一个锚点元素转换为 Anchor 记录；没有起始位置或图片时返回None"""
+    from_marker = parse_marker(anchor.find(XDR_NS + 'from'))
+    if from_marker is None:
+        return None
+    to_marker = parse_marker(anchor.find(XDR_NS + 'to'))
+
+    grp_sp = next(anchor.iter(XDR_NS + 'grpSp'), None)
+    group_transform = None
+    if grp_sp is not None:
+        # 组合图片：包含组合（及嵌套组合）中的所有图片
+        pics = list(grp_sp.iter(XDR_NS + 'pic'))
+        group_transform = parse_group_transform(grp_sp)
+    else:
+        # 单独的图片
+        pic = next(anchor.iter(XDR_NS + 'pic'), None)
+        pics = [pic] if pic is not None else []
+        if not pics:
+            return None
+    return Anchor(from_marker, to_marker, grp_sp is not None, tuple(parse_picture(pic) for pic in pics),
+                  group_transform)
+
+
+def parse_marker(marker):
+    """解析 xdr:from / xdr:to，缺少行列时返回None"""
+    if marker is None:
+        return None
+    col = marker.findtext(XDR_NS + 'col')
+    row = marker.findtext(XDR_NS + 'row')
+    if col is None or row is None:
+        return None
+    return Marker(int(col), int(row),
+                  int(marker.findtext(XDR_NS + 'colOff') or 0),
+                  int(marker.findtext(XDR_NS + 'rowOff') or 0))
+
+
+def parse_picture(pic):
+    """读取图片的关系ID和自身的位置尺寸"""
+    blip = next(pic.iter(A_NS + 'blip'), None)
+    embed_id = None if blip is None else (blip.get(R_NS + 'embed') or '')
+    off = ext = None
+    xfrm = pic.find(XDR_NS + 'spPr/' + A_NS + 'xfrm')
+    if xfrm is not None:
+        off_elem = xfrm.find(A_NS + 'off')
+        ext_elem = xfrm.find(A_NS + 'ext')
+        if off_elem is not None:
+            off = (int(off_elem.get('x', 0)), int(off_elem.get('y', 0)))
+        if ext_elem is not None:
+            ext = (int(ext_elem.get('cx', 0)), int(ext_elem.get('cy', 0)))
+    return Picture(embed_id, off, ext)
+
+
+def parse_group_transform(grp_sp):
+    """读取组合的 a:xfrm，缺少任一部分时返回None"""
+    xfrm = grp_sp.find(XDR_NS + 'grpSpPr/' + A_NS + 'xfrm')
+    if xfrm is None:
+        return None
+    values = []
+    for tag, x_name, y_name in (('off', 'x', 'y'), ('ext', 'cx', 'cy'),
+                                ('chOff', 'x', 'y'), ('chExt', 'cx', 'cy')):
+        elem = xfrm.find(A_NS + tag)
+        if elem is None:
+            return None
+        values.append((int(elem.get(x_name, 0)), int(elem.get(y_name, 0))))
+    return GroupTransform(*values)
+
+
+def marker_position(marker):
+    """按默认列宽和行高估算单元格标记在工作表上的位置（EMU）"""
+    return (marker.col * DEFAULT_COLUMN_WIDTH_EMU + marker.col_off,
+            marker.row * DEFAULT_ROW_HEIGHT_EMU + marker.row_off)
+
+
+def picture_bounds(anchor, picture):
+    """图片在工作表上的位置和尺寸 (x, y, cx, cy)，单位EMU；尺寸未知时 cx、cy 为None
+
+    Excel 写出的单独图片的 a:xfrm 和组合的 a:xfrm 都是工作表坐标，组合内图片的 a:xfrm
+    是组合子坐标系，按 chOff/chExt -> off/ext 换算（嵌套组合只按最外层换算）。
+    没有 a:xfrm 时由 xdr:from / xdr:to 按默认列宽行高估算。
+    """
+    transform = anchor.group_transform
+    if anchor.is_group and transform is not None and picture.off is not None:
+        scale_x = transform.ext[0] / transform.ch_ext[0] if transform.ch_ext[0] else 1.0
+        scale_y = transform.ext[1] / transform.ch_ext[1] if transform.ch_ext[1] else 1.0
+        x = transform.off[0] + (picture.off[0] - transform.ch_off[0]) * scale_x
+        y = transform.off[1] + (picture.off[1] - transform.ch_off[1]) * scale_y
+        if picture.ext is None:
+            return x, y, None, None
+        return x, y, picture.ext[0] * scale_x, picture.ext[1] * scale_y
+    if not anchor.is_group and picture.off is not None:
+        x, y = picture.off
+    else:
+        x, y = marker_position(anchor.from_marker)
+    if picture.ext is not None:
+        return x, y, picture.ext[0], picture.ext[1]
+    if not anchor.is_group and anchor.to_marker is not None:
+        to_x, to_y = marker_position(anchor.to_marker)
+        from_x, from_y = marker_position(anchor.from_marker)
+        return x, y, to_x - from_x, to_y - from_y
+    return x, y, None, None
@@ -0,0 +1,1106 @@
+# -*- coding: utf-8 -*-
+"""
+图片提取引擎
+功能：不依赖任何图形界面，从Excel文件中提取图片并按单元格地址保存、合并。
+进度通过标准库 logging 输出（记录器名 excel_extractor.engine），结果以 ExtractionReport 返回。
+"""
+
+import os
+import zipfile
+import zlib
+import shutil
+import logging
+import cProfile
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime
+import re
+
+from .archive import ArchiveWriter, archive_filename, check_archive_format
+from .drawing import iter_anchors, picture_bounds
+from .hashing import DEFAULT_HASH_ALGORITHM, HASH_BUFFER_SIZE, ambiguous_members, crc_key, new_hasher
+from .layout import check_layout
+from .manifest import MANIFEST_NAME, Manifest, workbook_fingerprint
+from .merge import (DEFAULT_JPEG_QUALITY, PILLOW_AVAILABLE, MergeSettings, check_merge_format,
+                    merge_groups, merge_output_name)
+from .metrics import PhaseTimer, format_bytes, peak_rss, write_prometheus_textfile
+from .outputs import OutputRegistry
+from .package import MEDIA_PREFIX, PackageIndex
+from .perceptual import DEFAULT_NEAR_THRESHOLD, PERCEPTUAL_AVAILABLE, check_options, find_near_duplicates
+from .placement import CellRange, PlacementIndex, anchor_cells, parse_range, sheet_key
+from .pipeline import DEFAULT_WRITE_WORKERS, QUEUE_DEPTH_PER_WORKER, MemberReader, WriterPool
+from .store import STORE_DIR_NAME, ContentStore, link_file
+from .thumbnails import THUMBNAIL_DIR_NAME, ThumbnailWriter
+
+logger = logging.getLogger(__name__)
+
+# 支持的图片扩展名
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.gif', '.bmp')
+# 无法确定所在工作表时使用的名称
+DEFAULT_SHEET_NAME = 'Sheet1'
+# 从压缩包流式写出图片时的读写缓冲区大小
+COPY_BUFFER_SIZE = HASH_BUFFER_SIZE
+# 输出目录名称
+EXTRACT_DIR_NAME = "提取结果"
+MERGE_DIR_NAME = "合并结果"
+# 写出线程中按单个成员处理（记录错误、跳过该成员）的异常：读取或解压失败（CRC错误、数据损坏、
+# 不支持的压缩方式、加密）和写入失败；其他异常视为程序错误，结束整个提取
+MEMBER_ERRORS = (OSError, EOFError, zipfile.BadZipFile, zlib.error, NotImplementedError, RuntimeError)
+
+
+@dataclass
+class ExtractionOptions:
+    """提取选项"""
+    merge: bool = True  # 提取完成后是否合并图片（需要Pillow库）
+    hash_algorithm: str = DEFAULT_HASH_ALGORITHM  # 重复检测使用的摘要算法
+    # 重复图片的输出方式：copy 为每个位置写独立副本；
+    # auto / reflink / hardlink / symlink 则每个不同内容只在"图片存储"目录保存一份，单元格目录中放链接
+    link_mode: str = 'copy'
+    # 写出图片的线程数；解压、摘要和写出分别在不同线程中进行，输出目录在网络文件系统上时可以适当增大
+    write_workers: int = DEFAULT_WRITE_WORKERS
+    merge_workers: int = None  # 合并阶段的并行数，默认等于CPU核心数
+    merge_executor: str = 'thread'  # 合并阶段使用线程池（thread）或进程池（process）
+    merge_max_pixels: int = None  # 合并图片的最大像素数，超过时按比例缩小，None 为不限制
+    # 合并图片的保存格式：png / webp（无损）/ jpeg（仅全部为JPEG照片的目录）/ source（保持来源格式）
+    merge_format: str = 'png'
+    png_compress_level: int = None  # PNG压缩级别 0-9，None 为Pillow默认值
+    jpeg_quality: int = DEFAULT_JPEG_QUALITY
+    # 合并图片的排列方式：horizontal / vertical / grid / columns（merge_columns 列）/ pack /
+    # anchor（按图片在工作表上的位置原样排列）
+    merge_layout: str = 'horizontal'
+    merge_columns: int = None
+    # 增量提取：根据输出目录中的清单跳过未变化的图片和合并，删除已不存在的输出
+    incremental: bool = False
+    # 近似重复检测使用的感知哈希（ahash / dhash / phash，需要Pillow和NumPy），None 为不检测；
+    # 汉明距离不超过 near_threshold 的图片与完全重复的图片一样按"_副本"规则命名
+    near_duplicates: str = None
+    near_threshold: int = DEFAULT_NEAR_THRESHOLD
+    # 缩略图的最大边长（可以有多个），空为不生成；需要Pillow库。
+    # 在近似重复检测或合并解码图片时顺便生成，没有被解码过的图片单独解码一次
+    thumbnail_sizes: tuple = ()
+    # 只提取指定工作表中的图片，或与指定区域（如 Sheet2!B2:B5000，不带工作表名时适用于所有工作表）相交的图片；
+    # 都为空时提取全部。筛选只用到关系文件和绘图XML，不在范围内的图片不会被解压
+    sheets: tuple = ()
+    ranges: tuple = ()
+    # 把提取结果和合并结果写入输出目录中的一个不压缩的归档（zip / tar，见 archive.py），
+    # 代替每个单元格一个目录；None 为写成目录和文件。不能与增量提取、链接模式、缩略图同时使用
+    archive: str = None
+    # 提取结束后把各阶段指标写成 Prometheus 文本文件（node_exporter textfile 格式），None 为不写
+    metrics_file: str = None
+    # 用 cProfile 分析整个提取过程并保存到此文件（可用 pstats / snakeviz 查看），None 为不分析
+    profile_file: str = None
+
+
+@dataclass
+class ExtractionReport:
+    """一次提取的结果统计"""
+    excel_file: str
+    output_dir: str
+    image_count: int = 0  # 压缩包中的图片文件数
+    extracted_count: int = 0  # 实际写出的图片数（同一图片可出现在多个位置）
+    unique_count: int = 0
+    duplicate_count: int = 0
+    merged_count: int = 0
+    merge_skipped: bool = False  # 需要合并但未安装Pillow库
+    groups: dict = field(default_factory=dict)  # 组合位置 -> 图片文件列表
+    hash_algorithm: str = DEFAULT_HASH_ALGORITHM
+    # 图片文件名（xl/media/下）-> 内容摘要；(大小, CRC32)唯一而未计算摘要的成员不在其中
+    digests: dict = field(default_factory=dict)
+    # 每个单元格目录本次写入的图片：目录名 -> [(文件名, 图片文件名), ...]
+    placements: dict = field(default_factory=dict)
+    # (目录名, 文件名) -> 图片在工作表上的位置 (x, y, cx, cy)（EMU），按原样排列合并时使用
+    positions: dict = field(default_factory=dict)
+    stored_count: int = 0  # 使用内容存储时实际保存的不同图片数
+    link_counts: dict = field(default_factory=dict)  # 链接方式 -> 使用次数
+    unchanged_count: int = 0  # 增量提取时未变化而跳过写出的图片数
+    unchanged_merge_count: int = 0  # 增量提取时未变化而跳过的合并数
+    removed_count: int = 0  # 增量提取时删除的过期输出文件数
+    removed_blob_count: int = 0  # 增量提取时删除的、已没有输出引用的存储图片数
+    near_duplicates: dict = field(default_factory=dict)  # 近似重复的图片文件名 -> 代表图片文件名
+    thumbnail_count: int = 0  # 写出的缩略图数（含增量提取时未变化的）
+    thumbnail_skipped: bool = False  # 需要缩略图但未安装Pillow库
+    # 各阶段的统计（阶段名 -> PhaseStats）：open 打开压缩包，rels 关系索引，drawings 绘图解析，
+    # hash 中央目录预筛，near_dup 近似重复检测，write 写出图片（边写边计算摘要），merge 合并，
+    # thumbnails 缩略图，manifest 清单
+    phases: dict = field(default_factory=dict)
+    archive_path: str = None  # 使用归档输出时的归档文件路径
+    peak_rss: int = None  # 提取结束时进程（含子进程）的峰值常驻内存（字节），不支持的平台为None
+
+    @property
+    def phase_times(self):
+        """各阶段墙钟时间（秒）"""
+        return {name: stats.wall for name, stats in self.phases.items()}
+
+    @property
+    def extract_dir(self):
+        return os.path.join(self.output_dir, EXTRACT_DIR_NAME)
+
+    @property
+    def merge_dir(self):
+        return os.path.join(self.output_dir, MERGE_DIR_NAME)
+
+
+def extract(excel_file, output_dir, options=None):
+    """从Excel文件提取图片到 output_dir，返回 ExtractionReport
+
+    文件无法打开等致命错误以异常形式抛出，单个图片的问题只记录日志。
+    """
+    engine = ExtractionEngine(options)
+    if not engine.options.profile_file:
+        return engine.run(excel_file, output_dir)
+    profiler = cProfile.Profile()
+    try:
+        return profiler.runcall(engine.run, excel_file, output_dir)
+    finally:
+        profiler.dump_stats(engine.options.profile_file)
+        logger.info(f"性能分析结果已保存: {engine.options.profile_file}")
+
+
+def load_placement_index(excel_file):
+    """只读取关系文件和绘图XML（不解压图片），返回工作簿中所有图片位置的 PlacementIndex
+
+    例如 load_placement_index("a.xlsx").query("Sheet2", parse_range("B2:B5000")[1])
+    """
+    with zipfile.ZipFile(excel_file, 'r') as zip_ref:
+        return read_placement_index(zip_ref)
+
+
+def read_placement_index(zip_ref):
+    """由已打开的压缩包建立 PlacementIndex，见 load_placement_index"""
+    index = PackageIndex(zip_ref)
+    image_files = [f for f in index.media_files if f.lower().endswith(IMAGE_EXTENSIONS)]
+    return PlacementIndex.from_locations(ExtractionEngine().analyze_image_locations(zip_ref, index, image_files))
+
+
+class ExtractionEngine:
+    def __init__(self, options=None):
+        self.options = options or ExtractionOptions()
+        self.store = None
+        self.output_base = None
+        # 增量提取：上次的清单，以及其中的摘要和输出能否复用（提取设置相同）
+        self.previous = None
+        self.reusable = False
+        # 输出路径登记表：本次分配的文件、输出目录中原有的文件、上次清单管理的文件
+        self.outputs = OutputRegistry()
+        self.unchanged_count = 0
+        # 图片文件名 -> 重复检测的键：内容摘要，或(大小, CRC32)唯一的成员由中央目录信息生成的键（不对外公开）
+        self.dedup_keys = {}
+        # 近似重复的图片文件名 -> 代表图片文件名
+        self.near_duplicates = {}
+        # 缩略图生成器，需要生成缩略图的成员，需要写出的缩略图
+        # [(输出路径, 相对路径, 成员, 尺寸, 清单记录), ...]，以及增量提取时未变化而跳过的缩略图数
+        self.thumbnails = None
+        self.thumbnail_members = set()
+        self.thumbnail_outputs = []
+        self.thumbnail_unchanged_count = 0
+        # 归档输出，以及单元格目录名 -> (工作表, 单元格, 是否组合)，写入索引
+        self.archive = None
+        self.archive_cells = {}
+        # 写出线程中失败的成员 [(图片文件名, [目标路径, ...]), ...]，写出结束后从结果中去掉
+        self.failed_writes = []
+        self.timer = PhaseTimer()
+
+    def manifest_settings(self):
+        """影响提取结果文件内容和命名的设置"""
+        return {'hash_algorithm': self.options.hash_algorithm, 'link_mode': self.options.link_mode,
+                'near_duplicates': self.options.near_duplicates, 'near_threshold': self.options.near_threshold,
+                'sheets': list(self.options.sheets), 'ranges': list(self.options.ranges),
+                'archive': self.options.archive}
+
+    def selectors(self):
+        """工作表 / 区域筛选条件 [(工作表名或None, CellRange或None), ...]，为空表示不筛选"""
+        return ([(sheet, None) for sheet in self.options.sheets]
+                + [parse_range(text) for text in self.options.ranges])
+
+    def merge_output_settings(self):
+        """影响合并图片内容的排列和保存设置"""
+        return {'format': self.options.merge_format, 'png_compress_level': self.options.png_compress_level,
+                'jpeg_quality': self.options.jpeg_quality, 'layout': self.options.merge_layout,
+                'columns': self.options.merge_columns}
+
+    def load_previous_manifest(self, output_base):
+        """增量提取时读取上次的清单"""
+        previous = Manifest.load(output_base)
+        if previous is None:
+            logger.info("增量提取: 未找到上次的清单，执行完整提取")
+            return
+        self.previous = previous
+        self.outputs = OutputRegistry(os.path.join(output_base, *rel_path.split('/'))
+                                      for rel_path in previous.output_paths())
+        self.reusable = previous.settings == self.manifest_settings()
+        if not self.reusable:
+            logger.info("增量提取: 提取设置已改变，重新写出所有图片")
+
+    def member_record(self, zip_ref, src_path, digest):
+        """清单中的图片记录：成员名、中央目录中的CRC32和大小、内容摘要"""
+        info = zip_ref.getinfo(src_path)
+        return {'member': src_path, 'crc': info.CRC, 'size': info.file_size, 'digest': digest}
+
+    def relative_output(self, path):
+        """输出文件相对于输出根目录的路径（统一使用/分隔）"""
+        return path[len(os.path.join(self.output_base, '')):].replace(os.sep, '/')
+
+    def report_from_manifest(self, report):
+        """工作簿与上次完全相同时，直接用清单还原本次的结果统计"""
+        summary = self.previous.summary
+        for rel_path, image in self.previous.images.items():
+            _, item, filename = rel_path.split('/')
+            image_file = image['member'][len(MEDIA_PREFIX):]
+            report.placements.setdefault(item, []).append((filename, image_file))
+            if image['digest'] is not None:
+                report.digests[image_file] = image['digest']
+        report.extracted_count = report.unchanged_count = len(self.previous.images)
+        report.image_count = summary.get('image_count', 0)
+        report.unique_count = summary.get('unique_count', 0)
+        report.duplicate_count = summary.get('duplicate_count', 0)
+        report.groups = summary.get('groups', {})
+        report.merged_count = report.unchanged_merge_count = summary.get('merged_count', 0)
+        report.merge_skipped = summary.get('merge_skipped', False)
+        report.near_duplicates = summary.get('near_duplicates', {})
+        report.thumbnail_count = summary.get('thumbnail_count', 0)
+        logger.info(f"增量提取: 工作簿未变化，跳过提取（{report.extracted_count} 个图片，{report.merged_count} 个合并）")
+        return report
+
+    def run(self, excel_file, output_base):
+        """提取Excel文件中的图片"""
+        try:
+            return self.run_extraction(excel_file, output_base)
+        finally:
+            # 出错时不留下写了一半的归档
+            if self.archive is not None:
+                self.archive.abort()
+
+    def run_extraction(self, excel_file, output_base):
+        report = ExtractionReport(excel_file=excel_file, output_dir=output_base,
+                                  hash_algorithm=self.options.hash_algorithm)
+        # 提前检查算法是否可用，避免写出一半才失败
+        new_hasher(self.options.hash_algorithm)
+        if self.options.near_duplicates:
+            check_options(self.options.near_duplicates, self.options.near_threshold)
+        if self.options.merge:
+            check_merge_format(self.options.merge_format)
+            check_layout(self.options.merge_layout, self.options.merge_columns)
+        if self.options.archive:
+            self.check_archive_options()
+        selectors = self.selectors()
+        self.output_base = output_base
+        manifest = Manifest(self.manifest_settings())
+        if self.options.incremental:
+            self.load_previous_manifest(output_base)
+        logger.info("开始分析Excel文件...")
+        timer = self.timer = PhaseTimer(report.phases)
+        timer.begin('open')
+        
+        # 直接从压缩包读取所需成员，不再解压整个文件到临时目录
+        with zipfile.ZipFile(excel_file, 'r') as zip_ref:
+            settings = dict(manifest.settings, merge=self.options.merge and PILLOW_AVAILABLE,
+                            merge_max_pixels=self.options.merge_max_pixels, **self.merge_output_settings(),
+                            thumbnail_sizes=sorted(self.options.thumbnail_sizes))
+            manifest.fingerprint = workbook_fingerprint(zip_ref, settings)
+            if (self.reusable and self.previous.fingerprint == manifest.fingerprint
+                    and self.previous.outputs_exist(output_base, self.outputs)):
+                timer.end()
+                self.report_from_manifest(report)
+                self.report_metrics(report)
+                return report
+            
+            # 一次性建立包结构索引（工作表、绘图、图片之间的关系），后续各阶段直接查表
+            timer.begin('rels')
+            index = PackageIndex(zip_ref)
+            timer.add(bytes_read=index.bytes_read)
+            
+            # 获取所有图片文件
+            image_files = [f for f in index.media_files if f.lower().endswith(IMAGE_EXTENSIONS)]
+            
+            if not image_files:
+                logger.info("未找到图片文件")
+                timer.begin('manifest')
+                self.finish_manifest(report, manifest)
+                timer.end()
+                self.report_metrics(report)
+                return report
+            
+            report.image_count = len(image_files)
+            logger.info(f"找到 {len(image_files)} 个图片文件")
+            
+            # 分析绘图关系和位置
+            timer.begin('drawings')
+            drawing_parts = self.selected_drawing_parts(index, selectors)
+            image_locations = self.analyze_image_locations(zip_ref, index, image_files, drawing_parts)
+            parsed_parts = index.drawing_parts if drawing_parts is None else drawing_parts
+            timer.add(bytes_read=sum(zip_ref.getinfo(part).file_size for part in parsed_parts),
+                      images=sum(len(locations) for locations in image_locations.values()))
+            if selectors:
+                image_locations, image_files = self.select_placements(index, image_locations, image_files, selectors)
+            
+            # 创建主提取结果目录
+            main_output_dir = report.extract_dir
+            if self.options.archive:
+                self.open_archive(report)
+            else:
+                self.outputs.ensure_dir(main_output_dir)
+                logger.info(f"创建主输出目录: {main_output_dir}")
+            
+            if self.options.link_mode != 'copy':
+                self.store = ContentStore(os.path.join(output_base, STORE_DIR_NAME), self.options.link_mode)
+                logger.info(f"使用内容存储目录: {self.store.root}（{self.options.link_mode}）")
+            
+            # 创建输出目录并复制图片
+            processed_groups = report.groups  # 记录已处理的组合图片
+            hash_tracker = {}  # 记录图片哈希值，用于检测重复
+            
+            timer.begin('hash')
+            self.prefill_digests(zip_ref, index, image_files, report.digests)
+            if self.options.thumbnail_sizes:
+                if PILLOW_AVAILABLE:
+                    self.thumbnails = ThumbnailWriter(os.path.join(output_base, THUMBNAIL_DIR_NAME),
+                                                      self.options.thumbnail_sizes)
+                    self.thumbnail_members = self.pending_thumbnail_members(zip_ref, index, image_files)
+                else:
+                    report.thumbnail_skipped = True
+                    logger.warning("警告: 未安装Pillow库，跳过缩略图")
+            if self.options.near_duplicates:
+                timer.begin('near_dup')
+                self.near_duplicates = self.detect_near_duplicates(zip_ref, index, image_files)
+                report.near_duplicates = dict(self.near_duplicates)
+            timer.begin('write')
+            
+            logger.info("开始检测重复图片...")
+            
+            # 摘要未知的成员由读取线程按顺序预先解压，写出交给写出线程池
+            depth = max(1, self.options.write_workers) * QUEUE_DEPTH_PER_WORKER
+            # 归档只能按顺序写入，使用一个写出线程
+            write_workers = 1 if self.archive is not None else self.options.write_workers
+            pending = [MEDIA_PREFIX + image_file for image_file in image_files
+                       if image_file not in self.dedup_keys and MEDIA_PREFIX + image_file in index.names]
+            with MemberReader(zip_ref, pending, depth) as reader, \
+                    WriterPool(write_workers, depth) as writers:
+                for image_file in image_files:
+                    # 获取图片位置信息列表
+                    location_list = image_locations.get(image_file, [])
+                    if not location_list:
+                        # 如果没有位置信息，使用默认值
+                        location_list = [{'cell': 'Unknown', 'sheet': DEFAULT_SHEET_NAME, 'is_group': False}]
+                    
+                    # 为每个位置创建目录
+                    targets = []
+                    for location_info in location_list:
+                        cell_address = location_info.get('cell', 'Unknown')
+                        sheet_name = location_info.get('sheet', DEFAULT_SHEET_NAME)
+                        is_group = location_info.get('is_group', False)
+                        
+                        # 创建以单元格地址命名的目录（在"提取结果"目录下）
+                        safe_cell_name = re.sub(r'[<>:"/\\|?*]', '_', f"{sheet_name}_{cell_address}")
+                        output_dir = os.path.join(main_output_dir, safe_cell_name)
+                        
+                        # 如果是组合图片，确保所有图片都放在同一个目录
+                        if is_group:
+                            # 检查是否已经为这个位置创建了目录
+                            group_key = f"{sheet_name}_{cell_address}"
+                            if group_key not in processed_groups:
+                                processed_groups[group_key] = []
+                                logger.debug(f"创建组合图片目录: 提取结果/{safe_cell_name}")
+                            
+                            processed_groups[group_key].append(image_file)
+                        
+                        self.outputs.ensure_dir(output_dir)
+                        if self.archive is not None:
+                            self.archive_cells.setdefault(safe_cell_name, (sheet_name, cell_address, is_group))
+                        targets.append((safe_cell_name, output_dir, location_info))
+                    
+                    # 从压缩包写出图片文件
+                    src_path = MEDIA_PREFIX + image_file
+                    if src_path not in index.names:
+                        for _ in targets:
+                            logger.warning(f"警告: 图片文件不存在: {src_path}")
+                        continue
+                    unique_filenames = self.write_image(zip_ref, src_path, image_file,
+                                                        [output_dir for _, output_dir, _ in targets],
+                                                        report.digests, hash_tracker, reader, writers)
+                    if unique_filenames is None:
+                        for _ in targets:
+                            logger.warning(f"警告: 无法计算图片哈希值: {src_path}")
+                        continue
+                    for (safe_cell_name, _, location_info), unique_filename in zip(targets, unique_filenames):
+                        # 检查是否是重复图片
+                        if unique_filename != image_file:
+                            report.duplicate_count += 1
+                        
+                        report.extracted_count += 1
+                        report.placements.setdefault(safe_cell_name, []).append((unique_filename, image_file))
+                        report.positions[(safe_cell_name, unique_filename)] = location_info.get('bounds')
+                        rel_path = f"{EXTRACT_DIR_NAME}/{safe_cell_name}/{unique_filename}"
+                        manifest.images[rel_path] = self.member_record(
+                            zip_ref, src_path, report.digests.get(image_file))
+                        if location_info.get('is_group', False):
+                            logger.debug(f"已提取组合图片: {image_file} -> 提取结果/{safe_cell_name}/{unique_filename}")
+                        else:
+                            logger.debug(f"已提取单独图片: {image_file} -> 提取结果/{safe_cell_name}/{unique_filename}")
+            self.drop_failed_writes(report, manifest, hash_tracker)
+            timer.add(images=report.extracted_count)
+        
+            # 合并所需的成员信息在压缩包关闭前记录下来
+            if self.options.merge and PILLOW_AVAILABLE:
+                for item, files in report.placements.items():
+                    sources = sorted(files)
+                    filenames = [filename for filename, _ in sources]
+                    manifest.merges[item] = {
+                        'output': f"{MERGE_DIR_NAME}/{merge_output_name(item, filenames, self.options.merge_format)}",
+                        'sources': [[filename, MEDIA_PREFIX + image_file,
+                                     zip_ref.getinfo(MEDIA_PREFIX + image_file).CRC,
+                                     zip_ref.getinfo(MEDIA_PREFIX + image_file).file_size]
+                                    for filename, image_file in sources],
+                        'max_pixels': self.options.merge_max_pixels, **self.merge_output_settings()}
+                    if self.options.merge_layout == 'anchor':
+                        # 按原样排列时图片在工作表上的位置变化也需要重新合并
+                        manifest.merges[item]['bounds'] = [
+                            list(report.positions.get((item, filename)) or ()) for filename in filenames]
+            
+            # 文件名确定之后，按输出路径决定哪些缩略图需要重新写出
+            if self.thumbnails is not None:
+                self.plan_thumbnails(zip_ref, report, manifest)
+        
+        report.unchanged_count = self.unchanged_count
+        if self.store is not None:
+            report.stored_count = self.store.stored_count
+            report.link_counts = dict(self.store.link_counts)
+            logger.info(f"内容存储: 保存 {report.stored_count} 个不同图片，链接方式 {report.link_counts}")
+        
+        # 输出组合图片统计信息
+        for group_key, images in processed_groups.items():
+            if len(images) > 1:
+                logger.debug(f"组合图片 {group_key} 包含 {len(images)} 张图片: {', '.join(images)}")
+        
+        # 输出重复图片统计信息
+        report.unique_count = len(hash_tracker)
+        logger.info(f"重复图片检测完成！")
+        logger.info(f"- 总图片数: {len(image_files)}")
+        logger.info(f"- 唯一图片数: {report.unique_count}")
+        logger.info(f"- 重复图片数: {report.duplicate_count}")
+        if report.duplicate_count > 0:
+            logger.info(f"- 重复图片已自动重命名，添加'_副本'后缀")
+        
+        logger.info(f"提取完成！共提取 {report.extracted_count} 个图片文件到 '提取结果' 目录")
+        if self.options.incremental:
+            logger.info(f"- 未变化跳过: {report.unchanged_count}")
+        
+        # 执行图片合并
+        if self.options.merge:
+            timer.begin('merge')
+            if PILLOW_AVAILABLE:
+                logger.info("开始合并图片...")
+                groups = []
+                for item, files in report.placements.items():
+                    merge = manifest.merges[item]
+                    if self.merge_unchanged(item, merge):
+                        report.unchanged_merge_count += 1
+                        continue
+                    output_path = os.path.join(output_base, *merge['output'].split('/'))
+                    if self.outputs.exists(output_path):
+                        os.remove(output_path)
+                    groups.append((item, [(filename, MEDIA_PREFIX + image_file, report.positions.get((item, filename)))
+                                          for filename, image_file in files]))
+                settings = MergeSettings(max_pixels=self.options.merge_max_pixels,
+                                         extract_dir=None if self.archive else report.extract_dir,
+                                         link_mode=self.options.link_mode,
+                                         thumbnails=self.thumbnails, **self.merge_output_settings())
+                report.merged_count = merge_groups(groups, report.merge_dir, excel_file,
+                                                   self.options.merge_workers, self.options.merge_executor,
+                                                   settings, self.write_archive_merge if self.archive else None)
+                self.add_merge_metrics(groups, manifest)
+                report.merged_count += report.unchanged_merge_count
+                logger.info(f"图片合并完成！共合并 {report.merged_count} 个目录的图片")
+                if self.options.incremental:
+                    logger.info(f"- 未变化跳过: {report.unchanged_merge_count}")
+            else:
+                report.merge_skipped = True
+                logger.warning("警告: 未安装Pillow库，跳过图片合并功能")
+        
+        if self.archive is not None:
+            self.close_archive(report)
+        
+        if self.thumbnails is not None:
+            timer.begin('thumbnails')
+            self.write_thumbnails(excel_file, report, manifest)
+        
+        timer.begin('manifest')
+        self.finish_manifest(report, manifest)
+        timer.end()
+        self.report_metrics(report)
+        return report
+
+    def prefill_digests(self, zip_ref, index, image_files, digests):
+        """只根据中央目录确定能预先得到去重键的成员，这些成员写出时不再计算摘要
+
+        - 增量提取时，CRC32和大小都没变的成员沿用上次的摘要（同时记入 digests）
+        - 不使用内容存储时，(大小, CRC32)唯一的成员不可能与其他成员重复，直接用CRC32和大小作为去重键，
+          这种键只在 self.dedup_keys 中，不作为摘要公开；内容存储以摘要命名文件，仍然需要计算摘要
+        """
+        infos = [zip_ref.getinfo(MEDIA_PREFIX + image_file) for image_file in image_files
+                 if MEDIA_PREFIX + image_file in index.names]
+        ambiguous = ambiguous_members(infos)
+        previous_digests = self.previous.member_digests() if self.reusable else {}
+        skipped = 0
+        for info in infos:
+            image_file = info.filename[len(MEDIA_PREFIX):]
+            digest = previous_digests.get((info.filename, info.CRC, info.file_size))
+            if digest is not None:
+                digests[image_file] = self.dedup_keys[image_file] = digest
+            elif self.store is None and info.filename not in ambiguous:
+                self.dedup_keys[image_file] = crc_key(info)
+                skipped += 1
+        logger.info(f"中央目录预筛: {len(infos) - len(ambiguous)} 个图片的大小和CRC32唯一，"
+                    f"{skipped} 个无需计算摘要")
+
+    def detect_near_duplicates(self, zip_ref, index, image_files):
+        """用感知哈希找出近似重复的图片，返回 {图片文件名: 代表图片文件名}"""
+        if not PERCEPTUAL_AVAILABLE:
+            logger.warning("警告: 未安装Pillow或NumPy库，跳过近似重复检测")
+            return {}
+        method = self.options.near_duplicates
+        logger.info(f"开始检测近似重复图片（{method}，阈值 {self.options.near_threshold}）...")
+        members = [MEDIA_PREFIX + image_file for image_file in image_files
+                   if MEDIA_PREFIX + image_file in index.names]
+        self.timer.add(bytes_read=sum(zip_ref.getinfo(member).file_size for member in members),
+                       images=len(members))
+        found = find_near_duplicates(zip_ref, members, method, self.options.near_threshold,
+                                     thumbnails=self.thumbnails, thumbnail_members=self.thumbnail_members)
+        near_duplicates = {}
+        for member, representative in found.items():
+            image_file = member[len(MEDIA_PREFIX):]
+            near_duplicates[image_file] = representative[len(MEDIA_PREFIX):]
+            logger.debug(f"近似重复: {image_file} ≈ {near_duplicates[image_file]}")
+        logger.info(f"近似重复检测完成: {len(near_duplicates)} 个图片与之前的图片相同或相似")
+        return near_duplicates
+
+    def thumbnail_record(self, zip_ref, member, max_size):
+        """清单中的缩略图记录：来源成员、中央目录中的CRC32和大小、最大边长"""
+        info = zip_ref.getinfo(member)
+        return {'member': member, 'crc': info.CRC, 'size': info.file_size, 'max_size': max_size}
+
+    def pending_thumbnail_members(self, zip_ref, index, image_files):
+        """近似重复检测时顺便生成缩略图的成员：增量提取时，上次已为各尺寸生成过且CRC32、大小未变的成员除外
+
+        此时输出文件名还没有确定，只是预估；实际需要写出的缩略图由 plan_thumbnails 按输出路径决定。
+        """
+        members = {MEDIA_PREFIX + image_file for image_file in image_files
+                   if MEDIA_PREFIX + image_file in index.names}
+        if not self.reusable:
+            return members
+        previous = {tuple(record.values()) for record in self.previous.thumbnails.values()}
+        return {member for member in members
+                if any(tuple(self.thumbnail_record(zip_ref, member, size).values()) not in previous
+                       for size in self.thumbnails.sizes)}
+
+    def plan_thumbnails(self, zip_ref, report, manifest):
+        """按输出路径确定需要写出的缩略图：增量提取时与上次清单中同一路径的记录比较，
+        成员未变但文件名变化（例如 _副本N 的序号移动）的位置也重新写出；未变化的直接记入清单"""
+        writer = self.thumbnails
+        for item, files in sorted(report.placements.items()):
+            for filename, image_file in sorted(files):
+                member = MEDIA_PREFIX + image_file
+                for size in writer.sizes:
+                    dst_path = writer.output_path(size, item, filename)
+                    rel_path = self.relative_output(dst_path)
+                    record = self.thumbnail_record(zip_ref, member, size)
+                    if (self.reusable and self.previous.thumbnails.get(rel_path) == record
+                            and self.outputs.exists(dst_path)):
+                        manifest.thumbnails[rel_path] = record
+                        self.thumbnail_unchanged_count += 1
+                        continue
+                    self.thumbnail_outputs.append((dst_path, rel_path, member, size, record))
+        self.thumbnail_members = {member for _, _, member, _, _ in self.thumbnail_outputs}
+
+    def write_thumbnails(self, excel_file, report, manifest):
+        """把暂存的缩略图放到 缩略图/<尺寸>/<单元格目录>/ 下；还没有生成的成员在这里解码一次"""
+        writer = self.thumbnails
+        logger.info(f"开始生成缩略图（{', '.join(str(size) for size in writer.sizes)}）...")
+        with zipfile.ZipFile(excel_file, 'r') as zip_ref:
+            # 需要写出但还没有暂存的成员（近似重复检测和合并都没有解码过，例如单张图片的目录）
+            missing = sorted({member for _, _, member, size, _ in self.thumbnail_outputs
+                              if not os.path.exists(writer.staged_path(size, member))})
+
+            def render(member):
+                try:
+                    writer.render_member(zip_ref, member)
+                except Exception as e:
+                    logger.warning(f"警告: 无法生成缩略图 {member}: {str(e)}")
+
+            with ThreadPoolExecutor() as pool:
+                list(pool.map(render, missing))
+            self.timer.add(bytes_read=sum(zip_ref.getinfo(member).file_size for member in missing))
+
+            # 每个成员的第一个位置移入暂存文件，其他位置链接到它
+            published = {}
+            for dst_path, rel_path, member, size, record in self.thumbnail_outputs:
+                first = published.get((member, size))
+                staged_path = writer.staged_path(size, member)
+                if first is None and not os.path.exists(staged_path):
+                    # 解码失败，上面已经记录警告
+                    continue
+                self.outputs.ensure_dir(os.path.dirname(dst_path))
+                if self.outputs.exists(dst_path):
+                    os.remove(dst_path)
+                if first is None:
+                    os.replace(staged_path, dst_path)
+                    self.timer.add(bytes_written=os.path.getsize(dst_path), images=1)
+                    published[(member, size)] = dst_path
+                else:
+                    link_file(first, dst_path, self.options.link_mode)
+                manifest.thumbnails[rel_path] = record
+        shutil.rmtree(writer.staging_dir, ignore_errors=True)
+        report.thumbnail_count = len(manifest.thumbnails)
+        logger.info(f"缩略图完成！共 {report.thumbnail_count} 个缩略图保存到 '{THUMBNAIL_DIR_NAME}' 目录")
+        if self.options.incremental:
+            logger.info(f"- 未变化跳过: {self.thumbnail_unchanged_count}")
+
+    def dedup_key(self, image_file):
+        """重复检测使用的键：近似重复的图片使用代表图片的键，与代表图片按同一组编号"""
+        representative = self.near_duplicates.get(image_file)
+        if representative is not None and representative in self.dedup_keys:
+            return self.dedup_keys[representative]
+        return self.dedup_keys[image_file]
+
+    def add_merge_metrics(self, groups, manifest):
+        """合并阶段的读写字节数：解码的来源图片大小之和，以及编码写出的合并图片大小之和
+        （单张图片的目录直接链接或复制，不计入）"""
+        for item, sources in groups:
+            if len(sources) < 2:
+                continue
+            merge = manifest.merges[item]
+            if self.archive is not None:
+                written = self.archive.entries.get(merge['output'], {}).get('size', 0)
+            else:
+                path = os.path.join(self.output_base, *merge['output'].split('/'))
+                written = os.path.getsize(path) if os.path.isfile(path) else 0
+            self.timer.add(bytes_read=sum(source[3] for source in merge['sources']),
+                           bytes_written=written, images=len(sources))
+
+    def report_metrics(self, report):
+        """输出各阶段的统计，需要时写出 Prometheus 文本文件"""
+        report.peak_rss = peak_rss()
+        for name, stats in report.phases.items():
+            speed = f"，{stats.images_per_sec:.0f} 张/秒" if stats.images and stats.wall else ""
+            logger.info(f"阶段 {name}: {stats.wall:.3f} 秒（CPU {stats.cpu:.3f} 秒），"
+                        f"读 {format_bytes(stats.bytes_read)}，写 {format_bytes(stats.bytes_written)}{speed}")
+        if report.peak_rss is not None:
+            logger.info(f"峰值内存: {format_bytes(report.peak_rss)}")
+        if self.options.metrics_file:
+            totals = {'images_extracted': report.extracted_count, 'images_unique': report.unique_count,
+                      'images_duplicate': report.duplicate_count, 'images_merged': report.merged_count,
+                      'peak_rss_bytes': report.peak_rss}
+            try:
+                write_prometheus_textfile(self.options.metrics_file, report.phases, totals,
+                                          {'workbook': os.path.basename(report.excel_file)})
+            except OSError as e:
+                logger.warning(f"警告: 无法写出指标文件 {self.options.metrics_file}: {str(e)}")
+
+    def merge_unchanged(self, item, merge):
+        """增量提取时，来源图片和输出都与上次相同的合并可以跳过"""
+        if not self.reusable or self.previous.merges.get(item) != merge:
+            return False
+        return self.outputs.exists(os.path.join(self.output_base, *merge['output'].split('/')))
+
+    def finish_manifest(self, report, manifest):
+        """删除上次清单中本次不再产生的输出，然后保存本次的清单"""
+        manifest.summary = {
+            'image_count': report.image_count, 'unique_count': report.unique_count,
+            'duplicate_count': report.duplicate_count, 'groups': report.groups,
+            'merged_count': report.merged_count, 'merge_skipped': report.merge_skipped,
+            'near_duplicates': report.near_duplicates, 'thumbnail_count': report.thumbnail_count,
+        }
+        if self.previous is not None:
+            stale = self.previous.output_paths() - manifest.output_paths()
+            keep_dirs = {os.path.normpath(path) for path in (self.output_base, report.extract_dir, report.merge_dir)}
+            for rel_path in sorted(stale):
+                path = os.path.join(self.output_base, *rel_path.split('/'))
+                if not self.outputs.exists(path):
+                    continue
+                try:
+                    os.remove(path)
+                except OSError as e:
+                    logger.warning(f"警告: 无法删除过期文件 {rel_path}: {str(e)}")
+                    continue
+                report.removed_count += 1
+                logger.debug(f"删除过期文件: {rel_path}")
+                # 单元格目录（以及缩略图的尺寸目录）清空后一并删除
+                parent = os.path.dirname(path)
+                while os.path.normpath(parent) not in keep_dirs:
+                    try:
+                        os.rmdir(parent)
+                    except OSError:
+                        break
+                    parent = os.path.dirname(parent)
+            if report.removed_count:
+                logger.info(f"增量提取: 删除 {report.removed_count} 个过期文件")
+            if self.store is not None:
+                # 过期输出删除后，存储中只保留本次输出引用的图片
+                referenced = {os.path.basename(self.store.blob_path(image['digest'], os.path.splitext(image['member'])[1]))
+                              for image in manifest.images.values()}
+                report.removed_blob_count = self.store.remove_unreferenced(referenced)
+                if report.removed_blob_count:
+                    logger.info(f"增量提取: 删除存储中 {report.removed_blob_count} 个不再被引用的图片")
+        if os.path.isdir(self.output_base):
+            try:
+                manifest.save(self.output_base)
+            except OSError as e:
+                logger.warning(f"警告: 无法保存清单: {str(e)}")
+                return
+            self.timer.add(bytes_written=os.path.getsize(os.path.join(self.output_base, MANIFEST_NAME)))
+
+    def write_image(self, zip_ref, src_path, image_file, output_dirs, digests, hash_tracker, reader, writers):
+        """把一个图片成员写到 output_dirs 中的每个目录，返回各位置的最终文件名；无法读取成员时返回None
+
+        文件名在调用线程中按顺序分配。去重键未知的成员从 reader 取出读取线程预先解压的内容计算摘要，
+        记入 digests，之后的位置直接复用；实际写出由 writers 中的写出线程完成，
+        同一成员的所有位置在一个任务中写出。使用内容存储时，成员只写入存储目录一次，单元格目录中放链接。
+        """
+        data = None
+        file_hash = digests.get(image_file)
+        if image_file not in self.dedup_keys:
+            _, data, error = next(reader)
+            if error is not None:
+                logger.error(f"计算文件哈希时出错 {src_path}: {str(error)}")
+                return None
+            hasher = new_hasher(self.options.hash_algorithm)
+            hasher.update(data)
+            file_hash = digests[image_file] = self.dedup_keys[image_file] = hasher.hexdigest()
+            self.timer.add(bytes_read=len(data))
+        dedup_key = self.dedup_key(image_file)
+        unique_filenames = []
+        # (目标路径, 是否已存在（上次的输出）)
+        targets = []
+        for output_dir in output_dirs:
+            unique_filename = self.get_unique_filename(output_dir, image_file, dedup_key, hash_tracker)
+            unique_filenames.append(unique_filename)
+            dst_path = os.path.join(output_dir, unique_filename)
+            if self.output_unchanged(zip_ref, src_path, dst_path):
+                self.unchanged_count += 1
+            else:
+                targets.append((dst_path, self.outputs.exists(dst_path)))
+        if targets:
+            if self.archive is not None:
+                writers.submit(self.write_archive_image, zip_ref, src_path, image_file, data, targets)
+            elif self.store is None:
+                writers.submit(self.write_copies, zip_ref, src_path, image_file, data, targets)
+            else:
+                writers.submit(self.write_links, zip_ref, src_path, image_file, file_hash, data, targets)
+        return unique_filenames
+
+    def write_copies(self, zip_ref, src_path, image_file, data, targets):
+        """（写出线程）为每个位置写出独立的文件
+
+        内容不在内存中时，只有一个位置的成员从压缩包流式写出；有多个位置的成员只解压一次，
+        所有位置都从内存写出，不再读回刚写出的文件（输出目录在网络存储上时每次读回都要多一轮往返）。
+        """
+        try:
+            if data is None and len(targets) > 1:
+                data = zip_ref.read(src_path)
+                self.timer.add(bytes_read=len(data))
+            for dst_path, existing in targets:
+                # 增量提取时目标位置可能还是上次的文件（可能是链接），先删除
+                if existing:
+                    os.remove(dst_path)
+                if data is not None:
+                    self.write_member_data(zip_ref, src_path, data, dst_path)
+                else:
+                    self.copy_zip_member(zip_ref, src_path, dst_path)
+        except MEMBER_ERRORS as e:
+            self.write_failed(src_path, image_file, targets, e)
+
+    def write_links(self, zip_ref, src_path, image_file, file_hash, data, targets):
+        """（写出线程）存储目录中还没有这张图片时先写入，再在每个位置创建链接"""
+        ext = os.path.splitext(image_file)[1]
+        part_path = self.store.part_path(image_file)
+        try:
+            if not self.store.has_blob(file_hash, ext):
+                # 先写到临时文件，相同内容的其他成员可能同时写入，commit 时只保留一份
+                if data is not None:
+                    self.write_member_data(zip_ref, src_path, data, part_path)
+                else:
+                    self.copy_zip_member(zip_ref, src_path, part_path)
+                self.store.commit(part_path, file_hash, ext)
+            for dst_path, existing in targets:
+                if existing:
+                    os.remove(dst_path)
+                self.store.link(file_hash, ext, dst_path)
+        except MEMBER_ERRORS as e:
+            self.write_failed(src_path, image_file, targets, e, extra_paths=[part_path])
+
+    def check_archive_options(self):
+        """检查归档格式，以及不能与归档同时使用的选项"""
+        check_archive_format(self.options.archive)
+        if self.options.incremental:
+            raise ValueError("归档输出不支持增量提取")
+        if self.options.link_mode != 'copy':
+            raise ValueError("归档输出不支持链接模式")
+        if self.options.thumbnail_sizes:
+            raise ValueError("归档输出不支持缩略图")
+
+    def open_archive(self, report):
+        """创建归档；提取结果和合并结果目录只在登记表中存在，文件名照常分配"""
+        self.outputs.ensure_dir(self.output_base)
+        report.archive_path = os.path.join(self.output_base, archive_filename(self.options.archive))
+        self.archive = ArchiveWriter(report.archive_path, self.options.archive, self.options.hash_algorithm)
+        self.outputs.add_virtual_dir(report.extract_dir)
+        self.outputs.add_virtual_dir(report.merge_dir)
+        logger.info(f"写入归档: {report.archive_path}")
+
+    def close_archive(self, report):
+        """写入索引并结束归档"""
+        archive, self.archive = self.archive, None
+        archive.close()
+        logger.info(f"归档完成: {report.archive_path}（{len(archive.entries)} 个文件，{format_bytes(archive.size)}）")
+
+    def write_archive_image(self, zip_ref, src_path, image_file, data, targets):
+        """（写出线程）把成员写入归档中每个位置的路径
+
+        内容不在内存中时先完整读取：已写入归档的部分无法撤回，读取出错时归档中不能留下写了一半的成员。
+        写入归档本身出错时归档已不完整，异常照常抛出，结束整个提取。
+        """
+        info = zip_ref.getinfo(src_path)
+        if data is None:
+            try:
+                data = zip_ref.read(src_path)
+            except MEMBER_ERRORS as e:
+                self.write_failed(src_path, image_file, targets, e, remove=False)
+                return
+            self.timer.add(bytes_read=len(data))
+        for dst_path, _ in targets:
+            rel_path = self.relative_output(dst_path)
+            item = rel_path.split('/')[1]
+            sheet, cell, is_group = self.archive_cells[item]
+            record = {'kind': 'image', 'sheet': sheet, 'cell': cell, 'dir': item, 'group': is_group,
+                      'member': src_path}
+            self.archive.add(rel_path, data, date_time=info.date_time, **record)
+            self.timer.add(bytes_written=info.file_size)
+
+    def write_failed(self, src_path, image_file, targets, error, remove=True, extra_paths=()):
+        """（写出线程）成员写出失败：删除已写出的部分（remove 为 False 时不在磁盘上）和 extra_paths 中的临时文件，
+        记录下来，写出结束后由 drop_failed_writes() 从结果中去掉这些位置
+
+        预筛时没有读取的成员到这里才第一次解压，读取或解压失败时记录与读取线程中失败的成员相同的信息。
+        """
+        if isinstance(error, OSError):
+            logger.error(f"写出图片时出错 {src_path}: {str(error)}")
+        else:
+            logger.error(f"计算文件哈希时出错 {src_path}: {str(error)}")
+            for _ in targets:
+                logger.warning(f"警告: 无法计算图片哈希值: {src_path}")
+        paths = [path for path, _ in targets] + list(extra_paths)
+        if remove:
+            for path in paths:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                except OSError as e:
+                    logger.warning(f"警告: 无法删除写出失败的文件 {path}: {str(e)}")
+        self.failed_writes.append((image_file, paths))
+
+    def drop_failed_writes(self, report, manifest, hash_tracker):
+        """写出失败的成员与读取失败的一样不计入结果：从统计、清单和重复检测中去掉它们的位置"""
+        extract_prefix = f"{EXTRACT_DIR_NAME}/"
+        for image_file, paths in self.failed_writes:
+            dedup_key = self.dedup_key(image_file)
+            for path in paths:
+                self.outputs.discard(path)
+                rel_path = self.relative_output(path)
+                if not rel_path.startswith(extract_prefix):
+                    # 内容存储中的临时文件
+                    continue
+                _, item, filename = rel_path.split('/')
+                manifest.images.pop(rel_path, None)
+                report.placements[item].remove((filename, image_file))
+                if not report.placements[item]:
+                    del report.placements[item]
+                report.positions.pop((item, filename), None)
+                report.extracted_count -= 1
+                if filename != image_file:
+                    report.duplicate_count -= 1
+                # hash_tracker 中的 count 为第一个之外的位置数，所有位置都失败时去掉这个键
+                hash_tracker[dedup_key]['count'] -= 1
+                if hash_tracker[dedup_key]['count'] < 0:
+                    del hash_tracker[dedup_key]
+        self.failed_writes = []
+
+    def write_archive_merge(self, item, filename, data):
+        """合并结果写入归档（合并按目录名顺序在当前线程返回）"""
+        sheet, cell, is_group = self.archive_cells[item]
+        self.archive.add(f"{MERGE_DIR_NAME}/{filename}", data, kind='merge', sheet=sheet, cell=cell, dir=item,
+                         group=is_group)
+
+    def output_unchanged(self, zip_ref, src_path, dst_path):
+        """增量提取时，上次在同一位置写出的是同一成员且CRC32、大小未变，文件也还在"""
+        if not self.reusable:
+            return False
+        previous = self.previous.images.get(self.relative_output(dst_path))
+        if previous is None or previous['member'] != src_path:
+            return False
+        info = zip_ref.getinfo(src_path)
+        if previous['crc'] != info.CRC or previous['size'] != info.file_size:
+            return False
+        return self.outputs.exists(dst_path)
+
+    def copy_zip_member(self, zip_ref, member_name, dst_path):
+        """将压缩包内的成员文件直接流式写入目标路径，并保留其修改时间"""
+        size = zip_ref.getinfo(member_name).file_size
+        self.timer.add(bytes_read=size, bytes_written=size)
+        with zip_ref.open(member_name) as src, open(dst_path, 'wb') as dst:
+            shutil.copyfileobj(src, dst, COPY_BUFFER_SIZE)
+        self.set_member_mtime(zip_ref, member_name, dst_path)
+
+    def write_member_data(self, zip_ref, member_name, data, dst_path):
+        """把已经解压的成员内容写入目标路径，并保留其修改时间"""
+        self.timer.add(bytes_written=len(data))
+        with open(dst_path, 'wb') as dst:
+            dst.write(data)
+        self.set_member_mtime(zip_ref, member_name, dst_path)
+
+    def set_member_mtime(self, zip_ref, member_name, path):
+        mtime = datetime(*zip_ref.getinfo(member_name).date_time).timestamp()
+        os.utime(path, (mtime, mtime))
+            
+    def get_unique_filename(self, base_path, filename, hash_value, hash_tracker):
+        """生成唯一的文件名，处理重复图片"""
+        name, ext = os.path.splitext(filename)
+        
+        # 检查是否是重复图片
+        if hash_value in hash_tracker:
+            # 这是重复图片，添加序号
+            hash_tracker[hash_value]['count'] += 1
+            count = hash_tracker[hash_value]['count']
+            unique_filename = f"{name}_副本{count}{ext}"
+            logger.debug(f"检测到重复图片: {filename} -> {unique_filename} (哈希: {hash_value[:8]}...)")
+        else:
+            # 这是新图片
+            hash_tracker[hash_value] = {'count': 0, 'original_name': filename}
+            unique_filename = filename
+            
+        # 确保文件名在目标目录中是唯一的（在登记表中查找，不逐个检查磁盘）
+        return self.outputs.assign(base_path, unique_filename)
+        
+    def selected_drawing_parts(self, index, selectors):
+        """筛选条件都指定了工作表时，只需要解析这些工作表的绘图；返回None表示解析所有绘图"""
+        if not selectors or any(sheet is None for sheet, _ in selectors):
+            return None
+        wanted = {sheet_key(sheet) for sheet, _ in selectors}
+        return [part for part in index.drawing_parts
+                if sheet_key(index.drawing_sheet(part) or DEFAULT_SHEET_NAME) in wanted]
+
+    def select_placements(self, index, image_locations, image_files, selectors):
+        """只保留与筛选条件相交的图片位置，返回 (筛选后的位置信息, 需要提取的图片文件列表)
+
+        在解压任何图片之前完成，不在范围内的图片成员不会被读取。
+        """
+        known = {sheet_key(sheet) for sheet in index.sheet_names}
+        for sheet in {sheet for sheet, _ in selectors if sheet is not None}:
+            if sheet_key(sheet) not in known:
+                logger.warning(f"警告: 工作簿中没有工作表 {sheet}")
+        placements = PlacementIndex.from_locations(image_locations)
+        selected = set()
+        for sheet, cell_range in selectors:
+            selected.update(placement.number for placement in placements.query(sheet, cell_range))
+        selected_locations = {}
+        for number in sorted(selected):
+            placement = placements.placements[number]
+            selected_locations.setdefault(placement.image_file, []).append(placement.location)
+        selected_files = [image_file for image_file in image_files if image_file in selected_locations]
+        logger.info(f"范围筛选: {len(placements.placements)} 个图片位置中 {len(selected)} 个在范围内，"
+                    f"需要提取 {len(selected_files)} 个图片")
+        return selected_locations, selected_files
+
+    def analyze_image_locations(self, zip_ref, index, image_files, drawing_parts=None):
+        """分析图片在Excel中的位置；drawing_parts 为None时分析所有绘图"""
+        image_locations = {}
+        
+        try:
+            # 分析绘图文件
+            if index.drawing_parts:
+                logger.info(f"找到 {len(index.drawing_parts)} 个绘图文件")
+                
+                for drawing_part in (index.drawing_parts if drawing_parts is None else drawing_parts):
+                    self.parse_drawing_xml(zip_ref, drawing_part, image_locations, index)
+            
+            # 如果没有找到位置信息，使用默认位置（只分析了部分绘图时不使用）
+            if not image_locations and drawing_parts is None:
+                logger.info("未能确定图片具体位置，使用默认位置")
+                # 为每个图片分配默认位置
+                for i, image_file in enumerate(image_files):
+                    col = i % 10  # 每行10个图片
+                    row = i // 10 + 1
+                    cell_address = self.col_num_to_letter(col) + str(row)
+                    image_locations[image_file] = [{
+                        'cell': cell_address,
+                        'sheet': DEFAULT_SHEET_NAME,
+                        'cells': CellRange(col, row - 1, col, row - 1)
+                    }]
+                
+        except Exception as e:
+            logger.error(f"分析图片位置时出错: {str(e)}")
+            
+        return image_locations
+
+    def parse_drawing_xml(self, zip_ref, drawing_part, image_locations, index):
+        """流式解析绘图XML文件获取图片位置"""
+        drawing_file = os.path.basename(drawing_part)
+        # 工作表名称来自 workbook.xml 中引用该绘图的工作表
+        sheet_name = index.drawing_sheet(drawing_part)
+        if sheet_name is None:
+            sheet_name = DEFAULT_SHEET_NAME
+            logger.warning(f"警告: 没有工作表引用 {drawing_file}，使用默认工作表名 {sheet_name}")
+        try:
+            pic_count = 0
+            with zip_ref.open(drawing_part) as f:
+                for anchor in iter_anchors(f):
+                    row = anchor.from_marker.row + 1  # Excel行号从1开始
+                    cell_address = self.col_num_to_letter(anchor.from_marker.col) + str(row)
+                    kind = "组合图片" if anchor.is_group else "单独图片"
+                    if anchor.is_group:
+                        logger.debug(f"发现组合图片在 {drawing_file}")
+                        logger.debug(f"组合图片位置: {cell_address}, 包含 {len(anchor.pictures)} 张图片")
+                    
+                    for picture in anchor.pictures:
+                        pic_count += 1
+                        if picture.embed_id is None:
+                            continue
+                        
+                        # 按本绘图自己的关系文件查找图片
+                        embed_id = picture.embed_id
+                        image_filename = index.drawing_image(drawing_part, embed_id)
+                        if image_filename is None:
+                            logger.warning(f"警告: {drawing_file} 中的图片关系 {embed_id or '(空)'} 无法解析，位置 {cell_address}")
+                            continue
+                        logger.debug(f"{kind}: {image_filename} -> {cell_address}")
+                        
+                        location = {
+                            'cell': cell_address,
+                            'sheet': sheet_name,
+                            'embed_id': embed_id,
+                            'is_group': anchor.is_group,
+                            'bounds': picture_bounds(anchor, picture),
+                            # 锚点占据的单元格区域（组合图片为整个组合），用于工作表 / 区域筛选
+                            'cells': anchor_cells(anchor.from_marker, anchor.to_marker)
+                        }
+                        if anchor.is_group:
+                            location['group_position'] = pic_count
+                        # 支持同一图片文件在多个位置
+                        image_locations.setdefault(image_filename, []).append(location)
+            
+            if pic_count > 0:
+                logger.info(f"在 {drawing_file}（{sheet_name}）中找到 {pic_count} 个图片")
+            else:
+                logger.info(f"在 {drawing_file} 中未找到图片")
+                        
+        except Exception as e:
+            logger.error(f"解析绘图XML文件 {drawing_part} 时出错: {str(e)}")
+            
+    def col_num_to_letter(self, col_num):
+        """将列号转换为Excel列字母"""
+        result = ""
+        while col_num >= 0:
+            result = chr(col_num % 26 + ord('A')) + result
+            col_num = col_num // 26 - 1
+            if col_num < 0:
+                break
+        return result
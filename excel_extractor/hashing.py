@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+"""
+图片内容摘要
+功能：提供可选择的哈希算法，用于重复图片检测。xxhash 为可选依赖，未安装时不可选 xxh3。
+压缩包中央目录已记录每个成员的CRC32和大小，按它们分组后，
+只有与其他成员同组的成员才可能内容相同，才需要计算摘要。
+"""
+
+import hashlib
+from collections import Counter
+try:
+    import xxhash
+    XXHASH_AVAILABLE = True
+except ImportError:
+    XXHASH_AVAILABLE = False
+
+# 默认算法：标准库自带，64位平台上比MD5更快
+DEFAULT_HASH_ALGORITHM = 'blake2b'
+HASH_ALGORITHMS = ('blake2b', 'md5', 'sha1', 'xxh3')
+# 读取数据计算摘要时的缓冲区大小
+HASH_BUFFER_SIZE = 1024 * 1024
+# 不计算摘要的成员以此前缀加CRC32和大小作为去重键
+CRC_KEY_PREFIX = 'crc32-'
+
+
+def new_hasher(algorithm=DEFAULT_HASH_ALGORITHM):
+    """创建指定算法的哈希对象（支持 update() / hexdigest()）"""
+    if algorithm == 'blake2b':
+        # 128位摘要足以区分图片内容，且与MD5的十六进制长度一致
+        return hashlib.blake2b(digest_size=16)
+    if algorithm == 'xxh3':
+        if not XXHASH_AVAILABLE:
+            raise ValueError("未安装xxhash库，无法使用 xxh3 算法：pip install xxhash")
+        return xxhash.xxh3_128()
+    if algorithm in ('md5', 'sha1'):
+        return hashlib.new(algorithm)
+    raise ValueError(f"不支持的哈希算法: {algorithm}")
+
+
+def crc_key(info):
+    """由中央目录信息生成的去重键，只对(大小, CRC32)唯一的成员使用"""
+    return f"{CRC_KEY_PREFIX}{info.CRC:08x}-{info.file_size}"
+
+
+def is_crc_key(digest):
+    return digest.startswith(CRC_KEY_PREFIX)
+
+
+def ambiguous_members(infos):
+    """按(大小, CRC32)分组，返回组内不止一个成员、需要计算摘要才能确定是否重复的成员名集合
+
+    infos 为 ZipInfo 列表，只使用中央目录中的信息，不读取任何数据。
+    """
+    counts = Counter((info.file_size, info.CRC) for info in infos)
+    return {info.filename for info in infos if counts[(info.file_size, info.CRC)] > 1}
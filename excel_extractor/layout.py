@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+"""
+合并图片的排列方式
+功能：根据每张图片的尺寸（只需读取文件头）计算画布大小和每张图片在画布上的位置，
+支持横向、纵向、网格、固定列数、装箱排列，以及按图片在工作表上的位置原样排列。
+"""
+
+import math
+
+# horizontal 横向一行（默认）；vertical 纵向一列；grid 接近正方形的网格；columns 固定列数的网格；
+# pack 按高度排序后逐行装箱，画布接近正方形且空白最少；anchor 按图片在工作表上的位置原样排列
+LAYOUT_MODES = ('horizontal', 'vertical', 'grid', 'columns', 'pack', 'anchor')
+DEFAULT_COLUMNS = 4
+# 没有图片尺寸可参考时，1像素 = 9525 EMU（96 DPI）
+EMU_PER_PIXEL = 9525
+
+
+def check_layout(mode, columns=None):
+    """检查排列方式和列数，不支持时抛出 ValueError"""
+    if mode not in LAYOUT_MODES:
+        raise ValueError(f"不支持的排列方式: {mode}")
+    if columns is not None and columns < 1:
+        raise ValueError(f"列数必须大于0: {columns}")
+
+
+def compute_layout(sizes, mode='horizontal', columns=None, bounds=None, scale=1.0):
+    """计算排列结果，返回 (画布尺寸, [(x, y, 宽, 高), ...])，与 sizes 顺序一致
+
+    sizes 为每张图片的原始尺寸；bounds 为每张图片在工作表上的 (x, y, cx, cy)（EMU），
+    只在 anchor 模式使用，缺少任何一张图片的位置时改为横向排列。
+    scale 为整体缩放比例，每张图片的目标尺寸可能与原始尺寸不同，粘贴前需要缩放。
+    """
+    if mode == 'anchor':
+        if bounds and all(bound is not None for bound in bounds):
+            return anchor_layout(sizes, bounds, scale)
+        mode = 'horizontal'
+    sizes = [(max(1, int(width * scale)), max(1, int(height * scale))) for width, height in sizes]
+    if mode == 'vertical':
+        return vertical_layout(sizes)
+    if mode == 'grid':
+        return grid_layout(sizes, math.ceil(math.sqrt(len(sizes))))
+    if mode == 'columns':
+        return grid_layout(sizes, columns or DEFAULT_COLUMNS)
+    if mode == 'pack':
+        return pack_layout(sizes)
+    return horizontal_layout(sizes)
+
+
+def layout_covers_canvas(canvas_size, rects, mode):
+    """排列结果是否铺满画布（没有空白区域时可以使用不透明的画布）
+
+    除 anchor 外的排列中图片互不重叠，面积之和等于画布面积即为铺满；anchor 模式可能重叠，视为有空白。
+    """
+    if mode == 'anchor':
+        return False
+    return sum(width * height for _, _, width, height in rects) == canvas_size[0] * canvas_size[1]
+
+
+def horizontal_layout(sizes):
+    """横向一行，高度取最大高度，每张图片垂直居中"""
+    max_height = max(height for _, height in sizes)
+    rects = []
+    x_offset = 0
+    for width, height in sizes:
+        rects.append((x_offset, (max_height - height) // 2, width, height))
+        x_offset += width
+    return (x_offset, max_height), rects
+
+
+def vertical_layout(sizes):
+    """纵向一列，宽度取最大宽度，每张图片水平居中"""
+    max_width = max(width for width, _ in sizes)
+    rects = []
+    y_offset = 0
+    for width, height in sizes:
+        rects.append(((max_width - width) // 2, y_offset, width, height))
+        y_offset += height
+    return (max_width, y_offset), rects
+
+
+def grid_layout(sizes, columns):
+    """按行依次填入 columns 列的网格，列宽、行高分别取该列、该行的最大值，图片在格子中居中"""
+    columns = max(1, min(columns, len(sizes)))
+    column_widths = [0] * columns
+    row_heights = [0] * math.ceil(len(sizes) / columns)
+    for i, (width, height) in enumerate(sizes):
+        column_widths[i % columns] = max(column_widths[i % columns], width)
+        row_heights[i // columns] = max(row_heights[i // columns], height)
+    column_offsets = offsets(column_widths)
+    row_offsets = offsets(row_heights)
+    rects = []
+    for i, (width, height) in enumerate(sizes):
+        column, row = i % columns, i // columns
+        rects.append((column_offsets[column] + (column_widths[column] - width) // 2,
+                      row_offsets[row] + (row_heights[row] - height) // 2, width, height))
+    return (sum(column_widths), sum(row_heights)), rects
+
+
+def offsets(lengths):
+    """各段的起始位置（前面各段长度之和）"""
+    result = []
+    total = 0
+    for length in lengths:
+        result.append(total)
+        total += length
+    return result
+
+
+def pack_layout(sizes):
+    """装箱排列：按高度从高到低逐行放置，行宽不超过总面积的平方根（至少为最宽图片的宽度）"""
+    max_width = max(width for width, _ in sizes)
+    target_width = max(max_width, int(math.sqrt(sum(width * height for width, height in sizes))))
+    rects = [None] * len(sizes)
+    x_offset = y_offset = shelf_height = canvas_width = 0
+    for i in sorted(range(len(sizes)), key=lambda i: (-sizes[i][1], i)):
+        width, height = sizes[i]
+        if x_offset and x_offset + width > target_width:
+            y_offset += shelf_height
+            x_offset = shelf_height = 0
+        rects[i] = (x_offset, y_offset, width, height)
+        x_offset += width
+        shelf_height = max(shelf_height, height)
+        canvas_width = max(canvas_width, x_offset)
+    return (canvas_width, y_offset + shelf_height), rects
+
+
+def anchor_layout(sizes, bounds, scale=1.0):
+    """按工作表上的位置原样排列
+
+    EMU到像素的比例取各图片 原始宽度/显示宽度 的中位数，使大多数图片保持原始分辨率；
+    图片按显示尺寸缩放，尺寸未知的图片保持原始尺寸。
+    """
+    ratios = sorted(width / bound[2] for (width, _), bound in zip(sizes, bounds) if bound[2])
+    pixels_per_emu = (ratios[len(ratios) // 2] if ratios else 1 / EMU_PER_PIXEL) * scale
+    min_x = min(bound[0] for bound in bounds)
+    min_y = min(bound[1] for bound in bounds)
+    rects = []
+    for (width, height), (x, y, cx, cy) in zip(sizes, bounds):
+        if cx and cy:
+            width, height = cx * pixels_per_emu, cy * pixels_per_emu
+        else:
+            width, height = width * scale, height * scale
+        rects.append((int(round((x - min_x) * pixels_per_emu)), int(round((y - min_y) * pixels_per_emu)),
+                      max(1, int(round(width))), max(1, int(round(height)))))
+    canvas_size = (max(x + width for x, _, width, _ in rects), max(y + height for _, y, _, height in rects))
+    return canvas_size, rects
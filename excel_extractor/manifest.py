@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+"""
+提取清单
+功能：在输出目录中记录每个输出文件的来源成员、压缩包中央目录里的CRC32/大小、内容摘要，
+以及每个合并图片和缩略图的来源。增量提取时据此跳过未变化的图片和合并，并删除已不存在的输出。
+清单为JSON Lines格式：第一行是版本和提取设置，之后每行一条记录。
+"""
+
+import os
+import json
+import hashlib
+import logging
+
+from .hashing import is_crc_key
+from .outputs import OutputRegistry
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = ".excel_extractor_manifest.jsonl"
+MANIFEST_VERSION = 1
+
+
+class Manifest:
+    def __init__(self, settings=None):
+        # 影响输出内容的提取设置，设置不同时旧清单中的摘要和输出不能复用
+        self.settings = settings or {}
+        # 工作簿指纹（中央目录中所有成员的名称、CRC32和大小）及上次提取的统计，用于整体跳过
+        self.fingerprint = None
+        self.summary = {}
+        # 输出文件相对路径 -> {"member", "crc", "size", "digest"}，未计算摘要的成员 digest 为 null
+        self.images = {}
+        # 合并目录名 -> {"output": 相对路径, "sources": [[文件名, 成员名, crc, size], ...],
+        #                "max_pixels": ..., "format" 等保存设置}
+        self.merges = {}
+        # 缩略图相对路径 -> {"member", "crc", "size", "max_size"}
+        self.thumbnails = {}
+
+    @classmethod
+    def load(cls, output_dir):
+        """读取输出目录中的清单，不存在或无法解析时返回None"""
+        path = os.path.join(output_dir, MANIFEST_NAME)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, encoding='utf-8') as f:
+                header = json.loads(f.readline())
+                if header.get('version') != MANIFEST_VERSION:
+                    logger.warning(f"警告: 清单版本不匹配，忽略旧清单: {path}")
+                    return None
+                manifest = cls(header.get('settings'))
+                manifest.fingerprint = header.get('fingerprint')
+                manifest.summary = header.get('summary') or {}
+                for line in f:
+                    record = json.loads(line)
+                    if record['type'] == 'image':
+                        manifest.images[record['path']] = {
+                            'member': record['member'], 'crc': record['crc'],
+                            'size': record['size'], 'digest': record['digest']}
+                    elif record['type'] == 'merge':
+                        manifest.merges[record['dir']] = {
+                            key: value for key, value in record.items() if key not in ('type', 'dir')}
+                    elif record['type'] == 'thumbnail':
+                        manifest.thumbnails[record['path']] = {
+                            'member': record['member'], 'crc': record['crc'],
+                            'size': record['size'], 'max_size': record['max_size']}
+            return manifest
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"警告: 无法读取清单 {path}: {str(e)}")
+            return None
+
+    def save(self, output_dir):
+        """写入清单（先写临时文件再替换，避免中途失败留下损坏的清单）"""
+        path = os.path.join(output_dir, MANIFEST_NAME)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            header = {'version': MANIFEST_VERSION, 'settings': self.settings,
+                      'fingerprint': self.fingerprint, 'summary': self.summary}
+            f.write(json.dumps(header, ensure_ascii=False) + "\n")
+            for rel_path, image in self.images.items():
+                f.write(json.dumps(dict(type='image', path=rel_path, **image), ensure_ascii=False) + "\n")
+            for item, merge in self.merges.items():
+                f.write(json.dumps(dict(type='merge', dir=item, **merge), ensure_ascii=False) + "\n")
+            for rel_path, thumbnail in self.thumbnails.items():
+                f.write(json.dumps(dict(type='thumbnail', path=rel_path, **thumbnail), ensure_ascii=False) + "\n")
+        os.replace(tmp_path, path)
+
+    def outputs_exist(self, output_dir, outputs=None):
+        """清单中的输出文件是否都还在（通过 OutputRegistry 每个目录只列出一次）"""
+        outputs = outputs or OutputRegistry()
+        return all(outputs.exists(os.path.join(output_dir, *rel_path.split('/')))
+                   for rel_path in self.output_paths())
+
+    def member_digests(self):
+        """(成员名, crc, size) -> 摘要，用于跳过未变化成员的读取和哈希
+
+        未计算摘要的成员不在其中（旧版清单中这类成员记录的是 crc32- 开头的键，同样跳过）。
+        """
+        return {(image['member'], image['crc'], image['size']): image['digest']
+                for image in self.images.values() if image['digest'] and not is_crc_key(image['digest'])}
+
+    def output_paths(self):
+        """清单管理的所有输出文件（相对路径）"""
+        return set(self.images) | {merge['output'] for merge in self.merges.values()} | set(self.thumbnails)
+
+
+def workbook_fingerprint(zip_ref, settings):
+    """只读取中央目录计算工作簿指纹：任何成员的增删或内容变化（CRC32/大小）都会改变指纹"""
+    hasher = hashlib.blake2b(digest_size=16)
+    hasher.update(json.dumps(settings, sort_keys=True).encode('utf-8'))
+    for info in zip_ref.infolist():
+        hasher.update(f"{info.filename}\0{info.CRC}\0{info.file_size}\n".encode('utf-8'))
+    return hasher.hexdigest()
@@ -0,0 +1,350 @@
+# -*- coding: utf-8 -*-
+"""
+图片合并
+功能：把本次提取写入每个单元格目录的图片合并为一张图片（横向、纵向、网格、装箱或按工作表上的位置排列），
+保存到"合并结果"。
+图片数据直接从Excel压缩包读取；各目录的合并相互独立，可在线程池或进程池中并行执行，
+结果与日志按目录名顺序输出。合并图片可保存为PNG、无损WebP、JPEG（仅全部为照片时）或保持来源格式；
+只有一张图片的目录保留原扩展名，直接链接提取结果中的文件，不重新编码。
+"""
+
+import io
+import os
+import shutil
+import logging
+import threading
+import zipfile
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+try:
+    from PIL import Image, features
+    PILLOW_AVAILABLE = True
+except ImportError:
+    PILLOW_AVAILABLE = False
+
+from .layout import compute_layout, layout_covers_canvas
+from .store import link_file
+
+logger = logging.getLogger(__name__)
+
+# 并行方式：thread 线程池（Pillow 解码/编码时会释放GIL），process 进程池
+MERGE_EXECUTORS = ('thread', 'process')
+COPY_BUFFER_SIZE = 1024 * 1024
+# 带透明通道的图片模式
+ALPHA_MODES = ('RGBA', 'RGBa', 'LA', 'La', 'PA')
+# 缩小图片时先按整数倍快速缩小，再精确缩放
+REDUCING_GAP = 3.0
+# 合并图片的保存格式：png；webp 无损WebP；jpeg 目录中全部为JPEG照片时保存为JPEG，否则PNG；
+# source 目录中图片格式相同时保持该格式，否则PNG
+MERGE_FORMATS = ('png', 'webp', 'jpeg', 'source')
+FORMAT_EXTENSIONS = {'PNG': '.png', 'WEBP': '.webp', 'JPEG': '.jpg', 'BMP': '.bmp'}
+# 可以保持的来源格式（GIF只有256色，保存合并图片会损失颜色，改用PNG）
+SOURCE_FORMATS = {'.png': 'PNG', '.jpg': 'JPEG', '.jpeg': 'JPEG', '.bmp': 'BMP'}
+DEFAULT_JPEG_QUALITY = 90
+# 本进程中打开的Excel压缩包句柄：文件路径 -> ZipFile
+_workbooks = {}
+_workbooks_lock = threading.Lock()
+
+
+@dataclass
+class MergeSettings:
+    """合并输出设置"""
+    format: str = 'png'  # 见 MERGE_FORMATS
+    png_compress_level: int = None  # PNG压缩级别 0-9，None 为Pillow默认值（6）；越小越快、文件越大
+    jpeg_quality: int = DEFAULT_JPEG_QUALITY
+    max_pixels: int = None  # 合并图片的最大像素数，超过时按比例缩小
+    extract_dir: str = None  # 提取结果目录（groups 中的文件都已写出），单张图片的目录从这里链接已写出的文件
+    link_mode: str = 'copy'  # 单张图片的链接方式；copy 只尝试写时复制（reflink），结果仍是独立文件
+    layout: str = 'horizontal'  # 排列方式，见 layout.LAYOUT_MODES
+    columns: int = None  # layout='columns' 时的列数
+    thumbnails: object = None  # ThumbnailWriter，解码图片时顺便生成缩略图
+
+
+def check_merge_format(merge_format):
+    """检查合并格式是否可用，不可用时抛出 ValueError"""
+    if merge_format not in MERGE_FORMATS:
+        raise ValueError(f"不支持的合并格式: {merge_format}")
+    if merge_format == 'webp' and PILLOW_AVAILABLE and not features.check('webp'):
+        raise ValueError("当前Pillow不支持WebP格式")
+
+
+def output_format(filenames, merge_format='png'):
+    """根据目录中图片的扩展名确定合并图片的保存格式（不需要解码图片）"""
+    extensions = {os.path.splitext(filename)[1].lower() for filename in filenames}
+    if merge_format == 'webp':
+        return 'WEBP'
+    if merge_format == 'jpeg' and extensions <= {'.jpg', '.jpeg'}:
+        return 'JPEG'
+    if merge_format == 'source':
+        formats = {SOURCE_FORMATS.get(extension) for extension in extensions}
+        if len(formats) == 1 and None not in formats:
+            return formats.pop()
+    return 'PNG'
+
+
+def merge_groups(groups, merge_output_dir, excel_file, workers=None, executor='thread', settings=None,
+                 sink=None):
+    """合并本次提取得到的每个目录的图片，返回合并成功的目录数
+
+    groups 为 [(目录名, [(文件名, 压缩包成员名[, 工作表上的位置]), ...]), ...]，直接来自提取阶段的结果，
+    图片数据从Excel压缩包中读取，不再重新扫描、读取输出目录。
+    workers 为并行数，默认等于CPU核心数；workers=1 时在当前线程顺序执行。
+    settings 为 MergeSettings。
+    sink 不为None时合并结果不写文件（merge_output_dir 不使用），按目录名顺序在当前线程调用
+    sink(目录名, 文件名, 内容)，例如写入归档。
+    """
+    if not PILLOW_AVAILABLE:
+        logger.error("错误: 未安装Pillow库，无法进行图片合并")
+        return 0
+
+    merged_count = 0
+
+    try:
+        if sink is None:
+            # 创建合并结果目录
+            os.makedirs(merge_output_dir, exist_ok=True)
+            logger.info(f"创建合并结果目录: {merge_output_dir}")
+        else:
+            merge_output_dir = None
+
+        # 按目录名排序保证顺序一致
+        settings = settings or MergeSettings()
+        tasks = [(item, sources, merge_output_dir, excel_file, settings)
+                 for item, sources in sorted(groups) if sources]
+
+        workers = workers or os.cpu_count() or 1
+        if workers == 1 or len(tasks) <= 1:
+            merged_count = handle_results((merge_group(*task) for task in tasks), tasks, sink)
+        else:
+            pool_class = ProcessPoolExecutor if executor == 'process' else ThreadPoolExecutor
+            logger.info(f"并行合并 {len(tasks)} 个目录（{executor}，并行数 {workers}）")
+            with pool_class(max_workers=workers) as pool:
+                # map 按提交顺序返回结果，日志只在当前线程输出
+                merged_count = handle_results(pool.map(merge_group, *zip(*tasks)), tasks, sink)
+
+    except Exception as e:
+        logger.error(f"图片合并过程中发生错误: {str(e)}")
+    finally:
+        close_workbooks()
+
+    return merged_count
+
+
+def handle_results(results, tasks, sink):
+    """按顺序输出各目录的日志，需要时把合并结果交给 sink，返回合并成功的目录数"""
+    merged_count = 0
+    for task, (merged, level, message, output) in zip(tasks, results):
+        logger.log(level, message)
+        if not merged:
+            continue
+        if sink is not None:
+            sink(task[0], *output)
+        merged_count += 1
+    return merged_count
+
+
+def merge_output_name(item, filenames, merge_format='png'):
+    """合并结果的文件名：单张图片为 目录名+原扩展名，多张为 目录名_合并+保存格式的扩展名"""
+    if len(filenames) == 1:
+        return item + os.path.splitext(filenames[0])[1]
+    return f"{item}_合并{FORMAT_EXTENSIONS[output_format(filenames, merge_format)]}"
+
+
+def save_options(image_format, settings):
+    """各格式的保存参数"""
+    if image_format == 'PNG':
+        options = {'optimize': False}
+        if settings.png_compress_level is not None:
+            options['compress_level'] = settings.png_compress_level
+        return options
+    if image_format == 'WEBP':
+        return {'lossless': True}
+    if image_format == 'JPEG':
+        return {'quality': settings.jpeg_quality}
+    return {}
+
+
+def open_workbook(excel_file):
+    """获取Excel压缩包的只读句柄，同一进程内的线程共享（ZipFile 支持多线程读取）"""
+    with _workbooks_lock:
+        zip_ref = _workbooks.get(excel_file)
+        if zip_ref is None:
+            zip_ref = zipfile.ZipFile(excel_file, 'r')
+            _workbooks[excel_file] = zip_ref
+        return zip_ref
+
+
+def close_workbooks():
+    """关闭本进程中缓存的压缩包句柄"""
+    with _workbooks_lock:
+        for zip_ref in _workbooks.values():
+            zip_ref.close()
+        _workbooks.clear()
+
+
+def merge_group(item, sources, merge_output_dir, excel_file, settings=None):
+    """合并单个目录的图片，返回 (是否成功, 日志级别, 日志消息, 内存中的结果)
+
+    merge_output_dir 为None时不写文件，内存中的结果为 (文件名, 内容)，否则为None。
+    """
+    settings = settings or MergeSettings()
+    try:
+        # 按文件名排序，确保合并顺序一致
+        sources = sorted(sources)
+        filenames = [source[0] for source in sources]
+        output_name = merge_output_name(item, filenames, settings.format)
+        output_file = os.path.join(merge_output_dir, output_name) if merge_output_dir is not None else None
+
+        if len(sources) == 1:
+            # 只有一张图片，链接提取结果中已写出的文件，不重新编码
+            filename, member_name = sources[0][:2]
+            if output_file is None:
+                data = open_workbook(excel_file).read(member_name)
+                return True, logging.DEBUG, f"单张图片复制: {item}", (output_name, data)
+            if settings.extract_dir:
+                # 提取阶段只把已写出的文件放入 groups，不再逐个检查是否存在；
+                # 只有 symlink 方式写出的是符号链接，需要链接到它指向的存储文件
+                extracted = os.path.join(settings.extract_dir, item, filename)
+                if settings.link_mode == 'symlink':
+                    extracted = os.path.realpath(extracted)
+                try:
+                    method = link_file(extracted, output_file, settings.link_mode)
+                    return True, logging.DEBUG, f"单张图片{'复制' if method == 'copy' else '链接'}: {item}", None
+                except FileNotFoundError:
+                    # 提取结果在写出之后被删除，改为从压缩包复制
+                    pass
+            zip_ref = open_workbook(excel_file)
+            with zip_ref.open(member_name) as src, open(output_file, 'wb') as dst:
+                shutil.copyfileobj(src, dst, COPY_BUFFER_SIZE)
+            mtime = datetime(*zip_ref.getinfo(member_name).date_time).timestamp()
+            os.utime(output_file, (mtime, mtime))
+            return True, logging.DEBUG, f"单张图片复制: {item}", None
+
+        # 多张图片，按排列方式合并；每张图片需要时才从压缩包中读取
+        zip_ref = open_workbook(excel_file)
+        image_format = output_format(filenames, settings.format)
+        images = [(f"{item}/{source[0]}", partial(zip_ref.open, source[1])) for source in sources]
+        bounds = [source[2] if len(source) > 2 else None for source in sources]
+        # JPEG 不支持透明度，合并到白色背景上
+        merged_image = merge_images(images, settings.max_pixels, allow_alpha=image_format != 'JPEG',
+                                    layout=settings.layout, columns=settings.columns, bounds=bounds,
+                                    thumbnails=settings.thumbnails, members=[source[1] for source in sources])
+        if merged_image:
+            message = f"合并完成: {item} ({len(sources)} 张图片)"
+            if output_file is None:
+                buffer = io.BytesIO()
+                merged_image.save(buffer, image_format, **save_options(image_format, settings))
+                return True, logging.DEBUG, message, (output_name, buffer.getvalue())
+            merged_image.save(output_file, image_format, **save_options(image_format, settings))
+            return True, logging.DEBUG, message, None
+        return False, logging.ERROR, f"合并失败: {item}", None
+    except Exception as e:
+        return False, logging.ERROR, f"合并目录 {item} 时发生错误: {str(e)}", None
+
+
+def image_has_alpha(img):
+    """根据文件头信息判断图片是否带透明度，不解码像素"""
+    return img.mode in ALPHA_MODES or 'transparency' in img.info
+
+
+@contextmanager
+def open_image(source):
+    """打开图片来源：文件路径、可 seek 的文件对象，或每次调用返回新文件对象的函数"""
+    fp = source() if callable(source) else source
+    if hasattr(fp, 'seek'):
+        fp.seek(0)
+    try:
+        with Image.open(fp) as img:
+            yield img
+    finally:
+        if callable(source):
+            fp.close()
+
+
+def merge_images_horizontally(image_sources, max_pixels=None, allow_alpha=True):
+    """将多张图片横向合并为一张图片，见 merge_images"""
+    return merge_images(image_sources, max_pixels, allow_alpha)
+
+
+def merge_images(image_sources, max_pixels=None, allow_alpha=True, layout='horizontal', columns=None,
+                 bounds=None, thumbnails=None, members=None):
+    """将多张图片按 layout 排列合并为一张图片（排列方式见 layout.py）
+
+    image_sources 为 [(名称, 来源), ...]，来源见 open_image，名称只用于日志；
+    bounds 为每张图片在工作表上的位置，只在 layout='anchor' 时使用。
+    thumbnails 为 ThumbnailWriter 时，members（每张图片的压缩包成员名）中还没有缩略图的成员
+    在粘贴前用同一次解码的结果生成缩略图。
+    先只读文件头得到尺寸和是否透明，一次性创建画布，再逐张解码、粘贴并立即释放，
+    同一时刻只有画布和一张图片在内存中。没有透明图片且图片铺满画布时使用RGB画布。
+    max_pixels 限制合并图片的像素数，超过时按比例缩小每张图片。
+    allow_alpha 为False时（例如保存为JPEG）始终使用白色背景的RGB画布，透明图片按透明度合成到背景上。
+    """
+    try:
+        # 第一遍：只读取文件头
+        headers = []
+        header_bounds = []
+        header_members = []
+        for i, (path, source) in enumerate(image_sources):
+            try:
+                with open_image(source) as img:
+                    headers.append((path, source, img.size, image_has_alpha(img)))
+                    header_bounds.append(bounds[i] if bounds else None)
+                    header_members.append(members[i] if members else None)
+            except Exception as e:
+                logger.error(f"无法打开图片 {path}: {str(e)}")
+                continue
+
+        if not headers:
+            return None
+
+        # 计算排列，超过 max_pixels 时整体缩小后重新排列
+        sizes = [size for _, _, size, _ in headers]
+        canvas_size, rects = compute_layout(sizes, layout, columns, header_bounds)
+        if max_pixels and canvas_size[0] * canvas_size[1] > max_pixels:
+            scale = (max_pixels / (canvas_size[0] * canvas_size[1])) ** 0.5
+            logger.debug(f"合并图片超过 {max_pixels} 像素，按 {scale:.3f} 缩小")
+            canvas_size, rects = compute_layout(sizes, layout, columns, header_bounds, scale)
+
+        use_alpha = allow_alpha and (any(has_alpha for _, _, _, has_alpha in headers) or
+                                     not layout_covers_canvas(canvas_size, rects, layout))
+        if use_alpha:
+            merged_image = Image.new('RGBA', canvas_size, (255, 255, 255, 0))
+        else:
+            merged_image = Image.new('RGB', canvas_size, (255, 255, 255))
+
+        # 第二遍：逐张解码、按需缩放并粘贴到排列位置
+        for (path, source, original_size, has_alpha), (x, y, width, height), member in zip(
+                headers, rects, header_members):
+            size = (width, height)
+            try:
+                with open_image(source) as img:
+                    if thumbnails is not None and member is not None and not thumbnails.is_staged(member):
+                        # 解码尺寸同时满足粘贴和缩略图的需要
+                        thumbnail_size = thumbnails.draft_size(original_size)
+                        img.draft(img.mode, (max(width, thumbnail_size[0]), max(height, thumbnail_size[1])))
+                        try:
+                            thumbnails.render(member, img)
+                        except Exception as e:
+                            logger.warning(f"警告: 无法生成缩略图 {path}: {str(e)}")
+                    elif size != original_size:
+                        img.draft(img.mode, size)
+                    if img.size != size:
+                        img = img.resize(size, Image.LANCZOS, reducing_gap=REDUCING_GAP)
+                    if has_alpha:
+                        # 透明图片按自身透明度粘贴
+                        img = img.convert('RGBA')
+                        merged_image.paste(img, (x, y), img)
+                    else:
+                        merged_image.paste(img.convert(merged_image.mode), (x, y))
+                    del img
+            except Exception as e:
+                logger.error(f"无法打开图片 {path}: {str(e)}")
+
+        return merged_image
+
+    except Exception as e:
+        logger.error(f"图片合并过程中发生错误: {str(e)}")
+        return None
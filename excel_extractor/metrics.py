@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+"""
+运行指标
+功能：读取进程的资源使用情况（峰值常驻内存等），按阶段统计墙钟时间、CPU时间、读写字节数、
+处理图片数和峰值内存，用于报告中的性能统计；可输出为 Prometheus 文本文件（node_exporter textfile 格式）。
+"""
+
+import os
+import sys
+import time
+import threading
+from dataclasses import asdict, dataclass
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def peak_rss():
+    """本进程及已结束子进程的峰值常驻内存（字节），不支持的平台返回None"""
+    if resource is None:
+        return None
+    peak = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+               resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    # macOS 以字节为单位，Linux 等以KB为单位
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+@dataclass
+class PhaseStats:
+    """一个阶段的统计"""
+    wall: float = 0.0  # 墙钟时间（秒）
+    cpu: float = 0.0  # 本进程所有线程的CPU时间（秒），不含进程池子进程
+    bytes_read: int = 0  # 从压缩包读取（解压后）的字节数
+    bytes_written: int = 0  # 写出的字节数（链接不计）
+    images: int = 0  # 处理的图片数
+    peak_rss: int = None  # 阶段结束时进程的峰值内存（字节，自进程启动以来的最高值），不支持的平台为None
+
+    @property
+    def images_per_sec(self):
+        return self.images / self.wall if self.wall else None
+
+    def to_dict(self):
+        return dict(asdict(self), images_per_sec=self.images_per_sec)
+
+
+class PhaseTimer:
+    """按阶段累计统计：begin(name) 结束当前阶段并开始新阶段，end() 结束当前阶段，
+    add() 把读写字节数和图片数计入当前阶段（可以在多个线程中调用）"""
+
+    def __init__(self, phases=None):
+        self.phases = phases if phases is not None else {}
+        self.current = None
+        self.started = None
+        self.cpu_started = None
+        self.lock = threading.Lock()
+
+    def begin(self, name):
+        self.end()
+        self.current = self.phases.setdefault(name, PhaseStats())
+        self.started = time.perf_counter()
+        self.cpu_started = time.process_time()
+
+    def end(self):
+        if self.current is not None:
+            self.current.wall += time.perf_counter() - self.started
+            self.current.cpu += time.process_time() - self.cpu_started
+            self.current.peak_rss = peak_rss()
+            self.current = None
+
+    def add(self, bytes_read=0, bytes_written=0, images=0):
+        with self.lock:
+            if self.current is None:
+                return
+            self.current.bytes_read += bytes_read
+            self.current.bytes_written += bytes_written
+            self.current.images += images
+
+
+def prometheus_text(phases, totals, labels):
+    """生成 Prometheus 文本格式的指标：每个阶段的统计，以及 totals 中的整体数值（名称 -> 值）"""
+    label_text = ','.join(f'{key}="{escape_label(value)}"' for key, value in labels.items())
+    lines = []
+    for field_name, help_text in (('wall', '阶段墙钟时间（秒）'), ('cpu', '阶段CPU时间（秒）'),
+                                  ('bytes_read', '阶段读取字节数'), ('bytes_written', '阶段写出字节数'),
+                                  ('images', '阶段处理图片数'), ('peak_rss', '阶段结束时的峰值内存（字节）')):
+        metric = f"excel_extractor_phase_{field_name}"
+        lines.append(f"# HELP {metric} {help_text}")
+        lines.append(f"# TYPE {metric} gauge")
+        for name, stats in phases.items():
+            value = getattr(stats, field_name)
+            if value is not None:
+                lines.append(f'{metric}{{{label_text},phase="{name}"}} {value}')
+    for name, value in totals.items():
+        if value is None:
+            continue
+        metric = f"excel_extractor_{name}"
+        lines.append(f"# TYPE {metric} gauge")
+        lines.append(f"{metric}{{{label_text}}} {value}")
+    return "\n".join(lines) + "\n"
+
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def write_prometheus_textfile(path, phases, totals, labels):
+    """写出 Prometheus 文本文件；先写临时文件再替换，采集程序不会读到写了一半的文件"""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(prometheus_text(phases, totals, labels))
+    os.replace(tmp_path, path)
+
+
+def format_bytes(size):
+    """把字节数格式化为便于阅读的字符串"""
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if size < 1024 or unit == 'GB':
+            return f"{size:.1f} {unit}" if unit != 'B' else f"{size} B"
+        size /= 1024
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+"""
+输出路径登记表
+功能：在内存中记录本次提取分配的输出文件，以及输出目录中原有的文件（每个目录只列出一次），
+分配不重名的文件名、判断文件是否已存在时不再逐个检查磁盘，目录也只创建一次。
+在 SMB / NFS 等网络文件系统上，每次检查都是一次网络往返。
+"""
+
+import os
+
+
+def path_key(path):
+    """比较路径使用的键（绝对路径；Windows 上不区分大小写）"""
+    return os.path.normcase(os.path.abspath(path))
+
+
+class OutputRegistry:
+    def __init__(self, managed_paths=()):
+        # 上次清单管理的输出文件：可以被本次输出覆盖，命名时不视为已占用
+        self.managed = {path_key(path) for path in managed_paths}
+        # 本次已分配的输出文件
+        self.assigned = set()
+        # 目录 -> 第一次用到时目录中已有的文件名（目录不存在为None）
+        self.listings = {}
+        # (目录, 文件名) -> 下一个尝试的序号，同名文件很多时不必每次从 _1 开始
+        self.next_counters = {}
+        # 只存在于归档中的目录：不在磁盘上创建，其中的文件名只与本次分配的比较
+        self.virtual = set()
+
+    def listing(self, directory):
+        """目录第一次用到时其中已有的文件名，目录不存在时为None；已经列出过上级目录时不再访问磁盘"""
+        key = path_key(directory)
+        if key not in self.listings:
+            parent, name = os.path.split(key)
+            if parent != key and parent in self.listings and (
+                    self.listings[parent] is None or name not in self.listings[parent]):
+                self.listings[key] = None
+            else:
+                try:
+                    self.listings[key] = {os.path.normcase(entry) for entry in os.listdir(directory)}
+                except (FileNotFoundError, NotADirectoryError):
+                    self.listings[key] = None
+        return self.listings[key]
+
+    def exists(self, path):
+        """文件在所在目录第一次列出时是否已存在（包括失效的符号链接）"""
+        directory, name = os.path.split(path_key(path))
+        names = self.listing(directory)
+        return names is not None and name in names
+
+    def ensure_dir(self, directory):
+        """目录不存在时创建（每个目录只检查、创建一次）"""
+        if self.listing(directory) is not None:
+            return
+        key = path_key(directory)
+        parent, name = os.path.split(key)
+        if parent in self.virtual:
+            self.virtual.add(key)
+            names = set()
+        else:
+            self.ensure_dir(parent)
+            try:
+                os.mkdir(directory)
+                names = set()
+            except FileExistsError:
+                # 上级目录列出之后由登记表以外的代码创建（例如缩略图的暂存目录）
+                names = {os.path.normcase(entry) for entry in os.listdir(directory)}
+        self.listings[parent].add(name)
+        self.listings[key] = names
+
+    def add_virtual_dir(self, directory):
+        """登记一个只存在于归档中的目录，之后其中的子目录也只在登记表中创建"""
+        key = path_key(directory)
+        self.virtual.add(key)
+        self.listings[key] = set()
+
+    def taken(self, path):
+        """本次已分配，或原来就存在且不是上次清单管理的文件"""
+        key = path_key(path)
+        if key in self.assigned:
+            return True
+        return key not in self.managed and self.exists(path)
+
+    def discard(self, path):
+        """写出失败、文件已删除时从登记表中去掉，之后不再视为已存在或已分配"""
+        key = path_key(path)
+        self.assigned.discard(key)
+        directory, name = os.path.split(key)
+        names = self.listings.get(directory)
+        if names is not None:
+            names.discard(name)
+
+    def assign(self, directory, filename):
+        """在 directory 中为 filename 分配一个没有被占用的文件名（重名时添加 _1、_2 ... 序号）并登记"""
+        final_filename = filename
+        if self.taken(os.path.join(directory, filename)):
+            name_part, ext_part = os.path.splitext(filename)
+            counter_key = (path_key(directory), filename)
+            counter = self.next_counters.get(counter_key, 1)
+            final_filename = f"{name_part}_{counter}{ext_part}"
+            while self.taken(os.path.join(directory, final_filename)):
+                counter += 1
+                final_filename = f"{name_part}_{counter}{ext_part}"
+            self.next_counters[counter_key] = counter + 1
+        self.assigned.add(path_key(os.path.join(directory, final_filename)))
+        return final_filename
@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+"""
+Excel包结构索引
+功能：一次性读取 workbook.xml 和压缩包中的关系文件（*.rels），建立部件关系图：
+工作表名称 -> 工作表部件 -> 绘图部件 -> (关系ID -> 图片成员)，供后续各阶段直接查表。
+"""
+
+import logging
+import posixpath
+import xml.etree.ElementTree as ET
+
+logger = logging.getLogger(__name__)
+
+RELS_NS = '{http://schemas.openxmlformats.org/package/2006/relationships}'
+MAIN_NS = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+R_NS = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}'
+# 关系类型以这些后缀结尾
+OFFICE_DOCUMENT_REL_SUFFIX = '/officeDocument'
+DRAWING_REL_SUFFIX = '/drawing'
+IMAGE_REL_SUFFIX = '/image'
+
+DEFAULT_WORKBOOK_PART = 'xl/workbook.xml'
+
+DRAWINGS_PREFIX = 'xl/drawings/'
+MEDIA_PREFIX = 'xl/media/'
+
+
+def rels_part_name(part_name):
+    """部件对应的关系文件：xl/drawings/drawing1.xml -> xl/drawings/_rels/drawing1.xml.rels"""
+    directory, name = posixpath.split(part_name)
+    return posixpath.join(directory, '_rels', name + '.rels')
+
+
+def resolve_target(part_name, target):
+    """把关系中的 Target（相对于源部件所在目录，或以/开头的绝对路径）转换为压缩包成员名"""
+    if target.startswith('/'):
+        return target.lstrip('/')
+    return posixpath.normpath(posixpath.join(posixpath.dirname(part_name), target))
+
+
+class PackageIndex:
+    def __init__(self, zip_ref):
+        self.zip_ref = zip_ref
+        self.names = set(zip_ref.namelist())
+        # 建立索引时读取的XML字节数（解压后）
+        self.bytes_read = 0
+        # 图片文件名列表（相对于 xl/media/），保持压缩包中的顺序
+        self.media_files = [name[len(MEDIA_PREFIX):] for name in zip_ref.namelist()
+                            if name.startswith(MEDIA_PREFIX) and not name.endswith('/')]
+        # 工作表名称列表（按工作簿中的顺序），以及 绘图部件 -> 工作表名称
+        self.sheet_names = []
+        self.drawing_sheets = {}
+        self._index_sheets()
+        # 绘图部件列表（xl/drawings/ 下一级的XML）
+        self.drawing_parts = sorted(
+            name for name in self.names
+            if name.startswith(DRAWINGS_PREFIX) and name.endswith('.xml')
+            and '/' not in name[len(DRAWINGS_PREFIX):])
+        # (绘图部件, 关系ID) -> 图片文件名（相对于 xl/media/）
+        self.drawing_images = {}
+        for drawing_part in self.drawing_parts:
+            for rel_id, rel_type, target in self.relationships(drawing_part):
+                if rel_type.endswith(IMAGE_REL_SUFFIX) and target.startswith(MEDIA_PREFIX):
+                    self.drawing_images[(drawing_part, rel_id)] = target[len(MEDIA_PREFIX):]
+                    logger.debug(f"关系映射: {posixpath.basename(drawing_part)} {rel_id} -> {target}")
+
+    def _index_sheets(self):
+        """读取 workbook.xml 中的工作表及其关系，建立 绘图部件 -> 工作表名称 的映射"""
+        workbook_part = DEFAULT_WORKBOOK_PART
+        for rel_id, rel_type, target in self.relationships(''):
+            if rel_type.endswith(OFFICE_DOCUMENT_REL_SUFFIX):
+                workbook_part = target
+                break
+        if workbook_part not in self.names:
+            logger.warning(f"警告: 未找到工作簿部件 {workbook_part}，无法确定工作表名称")
+            return
+
+        sheet_parts = {rel_id: target for rel_id, rel_type, target in self.relationships(workbook_part)}
+        try:
+            self.bytes_read += self.zip_ref.getinfo(workbook_part).file_size
+            with self.zip_ref.open(workbook_part) as f:
+                root = ET.parse(f).getroot()
+        except Exception as e:
+            logger.error(f"解析工作簿 {workbook_part} 时出错: {str(e)}")
+            return
+
+        for sheet in root.iter(MAIN_NS + 'sheet'):
+            sheet_name = sheet.get('name')
+            sheet_part = sheet_parts.get(sheet.get(R_NS + 'id'))
+            if not sheet_name or sheet_part is None:
+                continue
+            self.sheet_names.append(sheet_name)
+            # 工作表和图表工作表都通过 drawing 关系引用绘图
+            for rel_id, rel_type, target in self.relationships(sheet_part):
+                if rel_type.endswith(DRAWING_REL_SUFFIX):
+                    self.drawing_sheets[target] = sheet_name
+                    logger.debug(f"工作表映射: {target} -> {sheet_name}")
+
+    def relationships(self, part_name):
+        """读取部件的关系列表 [(关系ID, 类型, 目标成员名), ...]，忽略外部链接
+
+        part_name 为空字符串时读取包级关系 _rels/.rels。
+        """
+        rels_name = rels_part_name(part_name)
+        if rels_name not in self.names:
+            return []
+        try:
+            self.bytes_read += self.zip_ref.getinfo(rels_name).file_size
+            with self.zip_ref.open(rels_name) as f:
+                root = ET.parse(f).getroot()
+        except Exception as e:
+            logger.error(f"解析关系文件 {rels_name} 时出错: {str(e)}")
+            return []
+        relationships = []
+        for relationship in root.iter(RELS_NS + 'Relationship'):
+            rel_id = relationship.get('Id')
+            target = relationship.get('Target')
+            if not rel_id or not target or relationship.get('TargetMode') == 'External':
+                continue
+            relationships.append((rel_id, relationship.get('Type') or '', resolve_target(part_name, target)))
+        return relationships
+
+    def drawing_sheet(self, drawing_part):
+        """查找引用该绘图的工作表名称，找不到时返回None"""
+        return self.drawing_sheets.get(drawing_part)
+
+    def drawing_image(self, drawing_part, rel_id):
+        """查找绘图中关系ID对应的图片文件名，找不到时返回None"""
+        return self.drawing_images.get((drawing_part, rel_id))
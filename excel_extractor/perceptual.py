@@ -0,0 +1,326 @@
+# -*- coding: utf-8 -*-
+"""
+近似重复图片检测（可选，需要Pillow和NumPy库）
+功能：为每张图片计算64位感知哈希（aHash / dHash / pHash），汉明距离不超过阈值的图片视为近似重复。
+查找使用多索引哈希：把64位分成 阈值+1 段，距离不超过阈值的两个哈希至少有一段完全相同，
+只需比较同段取值相同的哈希，不做全体两两比较，可处理十万张以上的图片。
+"""
+
+import io
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from importlib.util import find_spec
+try:
+    from PIL import Image
+    # NumPy 导入较慢（约 0.1 秒），只在计算感知哈希和查找近似重复时才导入
+    PERCEPTUAL_AVAILABLE = find_spec('numpy') is not None
+except ImportError:
+    PERCEPTUAL_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+PERCEPTUAL_METHODS = ('ahash', 'dhash', 'phash')
+DEFAULT_NEAR_THRESHOLD = 4
+HASH_BITS = 64
+# 哈希尺寸：8x8 = 64位，pHash 先缩放到 32x32 再取低频 8x8
+HASH_SIZE = 8
+PHASH_SIZE = 32
+# 批量查找：不超过此大小的桶按间隔批量比较，更大的桶分块两两比较（每块最多 PAIR_BLOCK 对）
+SMALL_BUCKET = 64
+PAIR_BLOCK = 1 << 20
+# 批量查找需要比较的对数超过此值时改为逐个查找代表
+MAX_BATCH_PAIRS = 400_000_000
+
+
+def average_hash(img):
+    """aHash：8x8灰度图中亮于平均值的像素"""
+    import numpy as np
+    pixels = np.asarray(img.convert('L').resize((HASH_SIZE, HASH_SIZE), Image.BILINEAR), dtype=np.float32)
+    return _bits_to_int(pixels > pixels.mean())
+
+
+def difference_hash(img):
+    """dHash：9x8灰度图中每个像素是否亮于左边相邻像素"""
+    import numpy as np
+    pixels = np.asarray(img.convert('L').resize((HASH_SIZE + 1, HASH_SIZE), Image.BILINEAR), dtype=np.float32)
+    return _bits_to_int(pixels[:, 1:] > pixels[:, :-1])
+
+
+def perceptual_hash(img):
+    """pHash：32x32灰度图做二维DCT，取左上8x8低频系数与其中位数比较"""
+    import numpy as np
+    pixels = np.asarray(img.convert('L').resize((PHASH_SIZE, PHASH_SIZE), Image.BILINEAR), dtype=np.float64)
+    matrix = _dct_matrix(PHASH_SIZE)
+    dct = matrix @ pixels @ matrix.T
+    low = dct[:HASH_SIZE, :HASH_SIZE]
+    return _bits_to_int(low > np.median(low))
+
+
+@lru_cache(maxsize=None)
+def _dct_matrix(n):
+    """DCT-II 变换矩阵"""
+    import numpy as np
+    k = np.arange(n).reshape(-1, 1)
+    return np.cos(np.pi * (2 * np.arange(n) + 1) * k / (2 * n))
+
+
+def _bits_to_int(bits):
+    import numpy as np
+    return int.from_bytes(np.packbits(bits.ravel()).tobytes(), 'big')
+
+
+HASH_FUNCTIONS = {
+    'ahash': average_hash,
+    'dhash': difference_hash,
+    'phash': perceptual_hash,
+}
+
+
+def popcount(values):
+    """uint64 数组逐元素统计1的位数"""
+    import numpy as np
+    if hasattr(np, 'bitwise_count'):  # NumPy 2.0+
+        return np.bitwise_count(values)
+    # 并行位计数（SWAR）
+    values = values - ((values >> np.uint64(1)) & np.uint64(0x5555555555555555))
+    values = (values & np.uint64(0x3333333333333333)) + ((values >> np.uint64(2)) & np.uint64(0x3333333333333333))
+    values = (values + (values >> np.uint64(4))) & np.uint64(0x0F0F0F0F0F0F0F0F)
+    return (values * np.uint64(0x0101010101010101)) >> np.uint64(56)
+
+
+def check_options(method, threshold):
+    """检查感知哈希算法和阈值，不合法时抛出 ValueError"""
+    if method not in PERCEPTUAL_METHODS:
+        raise ValueError(f"不支持的感知哈希算法: {method}")
+    if not 0 <= threshold < HASH_BITS:
+        raise ValueError(f"近似重复阈值应在 0 到 {HASH_BITS - 1} 之间: {threshold}")
+
+
+def hamming_distance(a, b):
+    return bin(a ^ b).count('1')
+
+
+def hash_segments(threshold):
+    """多索引哈希的分段：把64位分成 threshold+1 段，返回 [(右移位数, 掩码), ...]"""
+    count = threshold + 1
+    segments = []
+    start = 0
+    for i in range(count):
+        width = HASH_BITS // count + (1 if i < HASH_BITS % count else 0)
+        segments.append((start, (1 << width) - 1))
+        start += width
+    return segments
+
+
+def segment_buckets(values, shift, mask):
+    """按一段的取值把哈希分桶，返回 (排序后的段值, 对应的下标, 各桶起点, 各桶大小)"""
+    import numpy as np
+    keys = (values >> np.uint64(shift)) & np.uint64(mask)
+    order = np.argsort(keys, kind='stable')
+    sorted_keys = keys[order]
+    starts = np.flatnonzero(np.concatenate(([True], sorted_keys[1:] != sorted_keys[:-1])))
+    sizes = np.diff(np.append(starts, len(sorted_keys)))
+    return sorted_keys, order, starts, sizes
+
+
+def pair_cost(values, threshold):
+    """批量查找需要比较的哈希对数（各段各桶内两两组合数之和）"""
+    import numpy as np
+    cost = 0
+    for shift, mask in hash_segments(threshold):
+        sizes = segment_buckets(values, shift, mask)[3].astype(np.int64)
+        cost += int((sizes * (sizes - 1) // 2).sum())
+    return cost
+
+
+def near_pairs(values, threshold):
+    """批量找出汉明距离不超过 threshold 的所有哈希对，返回 {后一个下标: [(距离, 前一个下标), ...]}
+
+    values 为互不相同的哈希（uint64数组）。只在每段取值相同的桶内比较：
+    小桶对排序后的数组按间隔 1、2、3…… 批量比较，大桶分块计算两两距离。
+    """
+    import numpy as np
+    firsts, seconds, distances = [], [], []
+
+    def collect(a, b, distance):
+        close = distance <= threshold
+        firsts.append(np.minimum(a, b)[close])
+        seconds.append(np.maximum(a, b)[close])
+        distances.append(distance[close])
+
+    for shift, mask in hash_segments(threshold):
+        sorted_keys, order, starts, sizes = segment_buckets(values, shift, mask)
+        small = np.repeat(sizes <= SMALL_BUCKET, sizes)
+        small_sizes = sizes[sizes <= SMALL_BUCKET]
+        for k in range(1, int(small_sizes.max()) if len(small_sizes) else 1):
+            same = np.flatnonzero((sorted_keys[:-k] == sorted_keys[k:]) & small[:-k])
+            if len(same):
+                a, b = order[same], order[same + k]
+                collect(a, b, popcount(values[a] ^ values[b]))
+        for start, size in zip(starts[sizes > SMALL_BUCKET].tolist(), sizes[sizes > SMALL_BUCKET].tolist()):
+            bucket = order[start:start + size]
+            bucket_values = values[bucket]
+            # 分块计算，控制临时数组大小
+            step = max(1, PAIR_BLOCK // size)
+            for row in range(0, size, step):
+                distance = popcount(bucket_values[row:row + step, None] ^ bucket_values[None, :])
+                rows, cols = np.nonzero(distance <= threshold)
+                a, b = bucket[row + rows], bucket[cols]
+                upper = a < b
+                collect(a[upper], b[upper], distance[rows[upper], cols[upper]])
+
+    candidates = {}
+    if not firsts:
+        return candidates
+    firsts = np.concatenate(firsts)
+    seconds = np.concatenate(seconds)
+    distances = np.concatenate(distances)
+    # 同一对可能在多段中被找到，去重
+    _, unique = np.unique(firsts * len(values) + seconds, return_index=True)
+    for i, j, distance in zip(firsts[unique].tolist(), seconds[unique].tolist(), distances[unique].tolist()):
+        candidates.setdefault(j, []).append((distance, i))
+    return candidates
+
+
+class RepresentativeIndex:
+    """只保存代表哈希的多索引哈希表，逐个查找距离最近的代表
+
+    大量哈希彼此接近时（例如同一张图片的许多变体），它们都归入同一个代表，
+    表中只有这一个代表，不必像批量查找那样列出所有相近的哈希对。
+    """
+
+    def __init__(self, threshold):
+        import numpy as np
+        self.threshold = threshold
+        self.segments = hash_segments(threshold)
+        self.tables = [{} for _ in self.segments]
+        self.values = []
+        # 与 values 相同的 uint64 数组（按需扩容），用于批量比较大桶
+        self.array = np.zeros(1024, dtype=np.uint64)
+
+    def add(self, value):
+        import numpy as np
+        position = len(self.values)
+        self.values.append(value)
+        if position >= len(self.array):
+            self.array = np.concatenate((self.array, np.zeros(len(self.array), dtype=np.uint64)))
+        self.array[position] = value
+        for table, (shift, mask) in zip(self.tables, self.segments):
+            table.setdefault((value >> shift) & mask, []).append(position)
+        return position
+
+    def nearest(self, value):
+        """返回距离最近（相同时取先加入）的代表位置，没有时返回None"""
+        import numpy as np
+        best = None
+        for table, (shift, mask) in zip(self.tables, self.segments):
+            bucket = table.get((value >> shift) & mask, ())
+            if len(bucket) > SMALL_BUCKET:
+                positions = np.array(bucket)
+                distances = popcount(self.array[positions] ^ np.uint64(value))
+                close = np.flatnonzero(distances <= self.threshold)
+                if len(close):
+                    # 距离最小、加入最早的代表
+                    nearest = close[np.lexsort((positions[close], distances[close]))[0]]
+                    candidate = (int(distances[nearest]), int(positions[nearest]))
+                    if best is None or candidate < best:
+                        best = candidate
+                continue
+            for position in bucket:
+                distance = hamming_distance(value, self.values[position])
+                if distance <= self.threshold and (best is None or (distance, position) < best):
+                    best = (distance, position)
+        return None if best is None else best[1]
+
+
+def cluster_near_duplicates(hashes, threshold=DEFAULT_NEAR_THRESHOLD):
+    """按顺序把每个哈希归入距离最近的代表，返回 {键: 代表键}（代表自身不在结果中）
+
+    hashes 为 [(键, 哈希), ...]。只与之前的代表比较而不做传递合并，
+    避免一串逐渐变化的图片被连成一组；距离相同时取先出现的代表。
+    哈希分布较分散时用NumPy批量找出所有相近的哈希对；
+    需要比较的对数过多（大量哈希彼此接近）时改为逐个查找代表，两种方式结果相同。
+    """
+    import numpy as np
+    # 哈希值完全相同的先归到第一次出现的键
+    first_keys = {}
+    for key, value in hashes:
+        first_keys.setdefault(value, key)
+    unique_values = list(first_keys)
+    values = np.array(unique_values, dtype=np.uint64)
+
+    representative_keys = []  # 每个不同哈希值的代表键
+    if pair_cost(values, threshold) <= MAX_BATCH_PAIRS:
+        candidates = near_pairs(values, threshold)
+        is_representative = []
+        for j, value in enumerate(unique_values):
+            representative = None
+            for distance, i in sorted(candidates.get(j, ())):
+                if is_representative[i]:
+                    representative = representative_keys[i]
+                    break
+            is_representative.append(representative is None)
+            representative_keys.append(first_keys[value] if representative is None else representative)
+    else:
+        index = RepresentativeIndex(threshold)
+        index_keys = []
+        for value in unique_values:
+            position = index.nearest(value)
+            if position is None:
+                index.add(value)
+                index_keys.append(first_keys[value])
+                representative_keys.append(first_keys[value])
+            else:
+                representative_keys.append(index_keys[position])
+
+    representatives_by_value = dict(zip(unique_values, representative_keys))
+    representatives = {}
+    for key, value in hashes:
+        representative = representatives_by_value[value]
+        if representative != key:
+            representatives[key] = representative
+    return representatives
+
+
+def hash_member(zip_ref, member_name, method, thumbnails=None):
+    """解码压缩包中的图片成员并计算感知哈希，无法解码时返回None
+
+    thumbnails 为 ThumbnailWriter 时用同一次解码的结果生成缩略图。
+    """
+    try:
+        with Image.open(io.BytesIO(zip_ref.read(member_name))) as img:
+            if thumbnails is not None:
+                # 解码到缩略图需要的尺寸，缩略图和哈希共用
+                img.draft(img.mode, thumbnails.draft_size(img.size))
+                try:
+                    thumbnails.render(member_name, img)
+                except Exception as e:
+                    logger.warning(f"警告: 无法生成缩略图 {member_name}: {str(e)}")
+            else:
+                # JPEG 在解码时直接缩小，只需要很小的尺寸
+                img.draft('L', (PHASH_SIZE * 2, PHASH_SIZE * 2))
+            return HASH_FUNCTIONS[method](img)
+    except Exception as e:
+        logger.warning(f"警告: 无法计算感知哈希 {member_name}: {str(e)}")
+        return None
+
+
+def find_near_duplicates(zip_ref, members, method='phash', threshold=DEFAULT_NEAR_THRESHOLD, workers=None,
+                         thumbnails=None, thumbnail_members=()):
+    """找出压缩包中近似重复的图片成员，返回 {成员名: 代表成员名}
+
+    members 的顺序决定代表：每组中最先出现的成员作为代表。
+    解码在线程池中进行（Pillow 解码时释放GIL）。
+    thumbnail_members 中的成员在解码时同时用 thumbnails 生成缩略图。
+    """
+    check_options(method, threshold)
+    thumbnail_members = set(thumbnail_members)
+
+    def hash_one(member):
+        return hash_member(zip_ref, member, method, thumbnails if member in thumbnail_members else None)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        values = list(pool.map(hash_one, members))
+    hashes = [(member, value) for member, value in zip(members, values) if value is not None]
+    return cluster_near_duplicates(hashes, threshold)
@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+"""
+提取流水线
+功能：把写出阶段拆成三个并行的环节——读取线程按顺序解压压缩包成员，调用方（摘要环节）计算摘要并分配文件名，
+写出线程池把图片写到磁盘或创建链接。环节之间使用有界队列，同时缓存在内存中的成员数有上限，
+解压、摘要（CPU）和写出（I/O）可以重叠进行，输出目录在网络文件系统上时也不会每次写入都停下来等待。
+"""
+
+import queue
+import threading
+
+# 写出线程数
+DEFAULT_WRITE_WORKERS = 4
+# 每个写出线程对应的队列长度，读取队列和写出队列各为 写出线程数 x 此值
+QUEUE_DEPTH_PER_WORKER = 2
+# 读取线程等待队列空位时检查是否已被关闭的间隔（秒）
+PUT_TIMEOUT = 0.1
+
+_DONE = object()
+
+
+class MemberReader:
+    """后台线程按给定顺序读取（解压）成员，next() 依次得到 (成员名, 内容, 异常)
+
+    读取失败的成员内容为None、异常不为None；队列满时读取线程等待，不会把整个压缩包读进内存。
+    """
+
+    def __init__(self, zip_ref, members, depth):
+        self.queue = queue.Queue(maxsize=depth)
+        self.closed = threading.Event()
+        self.thread = threading.Thread(target=self.run, args=(zip_ref, members), daemon=True)
+        self.thread.start()
+
+    def run(self, zip_ref, members):
+        for member in members:
+            try:
+                item = (member, zip_ref.read(member), None)
+            except Exception as e:
+                item = (member, None, e)
+            if not self.put(item):
+                return
+
+    def put(self, item):
+        while not self.closed.is_set():
+            try:
+                self.queue.put(item, timeout=PUT_TIMEOUT)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return self.queue.get()
+
+    def close(self):
+        self.closed.set()
+        self.thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class WriterPool:
+    """固定数量的写出线程，从有界队列中取任务执行；队列满时 submit() 阻塞
+
+    单个成员的读写错误由任务自己记录并跳过；任务抛出的异常（程序错误、归档损坏等无法继续的情况）
+    中的第一个在之后的 submit() 或 close() 时重新抛出，出错后剩余的任务不再执行。
+    """
+
+    def __init__(self, workers, depth):
+        self.queue = queue.Queue(maxsize=depth)
+        self.error = None
+        self.threads = [threading.Thread(target=self.run, daemon=True) for _ in range(max(1, workers))]
+        for thread in self.threads:
+            thread.start()
+
+    def run(self):
+        while True:
+            task = self.queue.get()
+            if task is _DONE:
+                return
+            if self.error is not None:
+                continue
+            fn, args = task
+            try:
+                fn(*args)
+            except BaseException as e:
+                if self.error is None:
+                    self.error = e
+
+    def submit(self, fn, *args):
+        if self.error is not None:
+            raise self.error
+        self.queue.put((fn, args))
+
+    def close(self):
+        """等待所有任务完成"""
+        for _ in self.threads:
+            self.queue.put(_DONE)
+        for thread in self.threads:
+            thread.join()
+        if self.error is not None:
+            raise self.error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+            return
+        # 调用方已经出错，只等待线程结束，保留原来的异常
+        self.error = self.error or exc_value
+        for _ in self.threads:
+            self.queue.put(_DONE)
+        for thread in self.threads:
+            thread.join()
@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+"""
+图片位置的空间索引
+功能：把绘图中每个图片位置占据的单元格区域（锚点的起止行列，组合图片为整个组合）按工作表放入按行分桶的索引，
+查询"哪些图片与某个区域相交"时只检查区域覆盖的行桶。
+提取时的工作表 / 区域筛选（如 Sheet2!B2:B5000）只用到关系文件和绘图XML，在解压任何图片之前完成。
+"""
+
+import re
+from collections import namedtuple
+
+# 每个行桶包含的行数
+BUCKET_ROWS = 64
+# Excel 的最大行列数（行列号从0开始时的上限）
+MAX_ROW = 1048575
+MAX_COL = 16383
+
+# 单元格区域：起止列号、行号（均从0开始，包含两端）
+CellRange = namedtuple('CellRange', 'min_col min_row max_col max_row')
+# 一个图片位置：序号（加入索引的顺序）、图片文件名（相对于 xl/media/）、工作表、占据的单元格区域、
+# 提取时使用的位置信息（单元格地址、是否组合等）
+Placement = namedtuple('Placement', 'number image_file sheet cells location')
+
+# [工作表!]区域，工作表名包含空格等字符时用单引号括起（其中的单引号写作两个）
+RANGE_PATTERN = re.compile(r"^(?:(?:'((?:[^']|'')+)'|([^'!]+))!)?([^!]*)$")
+# 单元格或整行、整列：A1、$A$1、A、1
+CELL_PATTERN = re.compile(r'^\$?([A-Za-z]{1,3})?\$?([0-9]+)?$')
+
+
+def column_number(letters):
+    """Excel列字母转换为列号（从0开始）：A -> 0，AA -> 26"""
+    number = 0
+    for letter in letters.upper():
+        number = number * 26 + ord(letter) - ord('A') + 1
+    return number - 1
+
+
+def parse_cell(text):
+    """解析单元格引用，返回 (列号, 行号)，整行引用的列号、整列引用的行号为None"""
+    match = CELL_PATTERN.match(text.strip())
+    if not match or not any(match.groups()) or match.group(2) == '0':
+        raise ValueError(f"无效的单元格引用: {text}")
+    letters, digits = match.groups()
+    col = column_number(letters) if letters else None
+    row = int(digits) - 1 if digits else None
+    if (col is not None and col > MAX_COL) or (row is not None and row > MAX_ROW):
+        raise ValueError(f"单元格引用超出范围: {text}")
+    return col, row
+
+
+def parse_range(text):
+    """解析 [工作表!]区域 形式的区域引用，返回 (工作表名或None, CellRange)
+
+    支持 B2:B5000、B2、B:D（整列）、2:10（整行）和 'My Sheet'!A1:C3；没有工作表名时适用于所有工作表。
+    """
+    match = RANGE_PATTERN.match(text.strip())
+    if not match or not match.group(3):
+        raise ValueError(f"无效的区域引用: {text}")
+    quoted, plain, area = match.groups()
+    sheet = quoted.replace("''", "'") if quoted else plain
+    start, _, end = area.partition(':')
+    start_col, start_row = parse_cell(start)
+    end_col, end_row = parse_cell(end) if end else (start_col, start_row)
+    if (start_col is None) != (end_col is None) or (start_row is None) != (end_row is None):
+        raise ValueError(f"无效的区域引用: {text}")
+    min_col, max_col = (0, MAX_COL) if start_col is None else sorted((start_col, end_col))
+    min_row, max_row = (0, MAX_ROW) if start_row is None else sorted((start_row, end_row))
+    return sheet, CellRange(min_col, min_row, max_col, max_row)
+
+
+def anchor_cells(from_marker, to_marker=None):
+    """锚点占据的单元格区域；终点偏移为0时图片止于该行（列）的起始边，不占据该行（列）"""
+    if to_marker is None:
+        return CellRange(from_marker.col, from_marker.row, from_marker.col, from_marker.row)
+    max_col = to_marker.col - 1 if to_marker.col_off == 0 and to_marker.col > from_marker.col else to_marker.col
+    max_row = to_marker.row - 1 if to_marker.row_off == 0 and to_marker.row > from_marker.row else to_marker.row
+    return CellRange(from_marker.col, from_marker.row, max(from_marker.col, max_col), max(from_marker.row, max_row))
+
+
+def intersects(a, b):
+    return a.min_col <= b.max_col and b.min_col <= a.max_col and a.min_row <= b.max_row and b.min_row <= a.max_row
+
+
+def sheet_key(sheet):
+    """Excel 工作表名不区分大小写"""
+    return sheet.casefold()
+
+
+class PlacementIndex:
+    def __init__(self, bucket_rows=BUCKET_ROWS):
+        self.bucket_rows = bucket_rows
+        self.placements = []
+        # 工作表 -> {行桶号: [位置序号, ...]}，跨越多个行桶的位置在每个桶中都登记
+        self.buckets = {}
+
+    @classmethod
+    def from_locations(cls, image_locations):
+        """由 {图片文件名: [位置信息, ...]} 建立索引；位置信息中的 cells 为占据的单元格区域"""
+        index = cls()
+        for image_file, locations in image_locations.items():
+            for location in locations:
+                index.add(image_file, location)
+        return index
+
+    def add(self, image_file, location):
+        cells = location['cells']
+        placement = Placement(len(self.placements), image_file, location['sheet'], cells, location)
+        self.placements.append(placement)
+        key = sheet_key(placement.sheet)
+        buckets = self.buckets.setdefault(key, {})
+        for bucket in range(cells.min_row // self.bucket_rows, cells.max_row // self.bucket_rows + 1):
+            buckets.setdefault(bucket, []).append(placement.number)
+        return placement
+
+    def query(self, sheet=None, cell_range=None):
+        """与区域相交的图片位置（按加入索引的顺序）；sheet 为None时查询所有工作表，cell_range 为None时不限区域"""
+        keys = list(self.buckets) if sheet is None else [sheet_key(sheet)]
+        numbers = set()
+        for key in keys:
+            buckets = self.buckets.get(key, {})
+            if cell_range is None:
+                numbers.update(number for bucket in buckets.values() for number in bucket)
+                continue
+            first = cell_range.min_row // self.bucket_rows
+            last = cell_range.max_row // self.bucket_rows
+            # 区域跨越的行桶比已有的行桶多时（例如整列），直接遍历已有的行桶
+            if last - first + 1 > len(buckets):
+                candidates = (bucket for number, bucket in buckets.items() if first <= number <= last)
+            else:
+                candidates = (buckets[number] for number in range(first, last + 1) if number in buckets)
+            for bucket in candidates:
+                numbers.update(number for number in bucket if intersects(self.placements[number].cells, cell_range))
+        return [self.placements[number] for number in sorted(numbers)]
+
+    def anchored_at(self, sheet, col, row):
+        """左上角位于指定单元格的图片位置，即提取结果中该单元格目录里的图片"""
+        return [placement for placement in self.query(sheet, CellRange(col, row, col, row))
+                if (placement.cells.min_col, placement.cells.min_row) == (col, row)]
@@ -0,0 +1,355 @@
+# -*- coding: utf-8 -*-
+"""
+本地图片服务
+功能：按需从Excel文件中读取单个单元格的图片或合并图片，不需要先完整提取。
+最近使用的工作簿保持打开（压缩包句柄和图片位置索引，LRU），常用的图片和合并结果保存在按字节数限制大小的缓存中，
+重复请求直接从内存返回。工作簿文件被修改后自动重新打开。
+
+用法：python -m excel_extractor.server 工作簿目录 [--port 8765] [--unix-socket 路径]
+接口（GET，路径中的工作簿名、工作表名需要URL编码）：
+  /<工作簿>                        图片位置列表（JSON）
+  /<工作簿>/<工作表>/<单元格>        该单元格的图片；有多张图片（组合）时返回合并图片
+  /<工作簿>/<工作表>/<单元格>/<n>    该单元格的第 n 张图片（从1开始，按图片文件名排序）
+"""
+
+import argparse
+import io
+import json
+import logging
+import mimetypes
+import os
+import socketserver
+import sys
+import threading
+import zipfile
+from collections import OrderedDict
+from contextlib import contextmanager
+from functools import partial
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote, urlsplit
+
+from .cli import configure_logging
+from .engine import read_placement_index
+from .layout import DEFAULT_COLUMNS, LAYOUT_MODES, check_layout
+from .merge import (MERGE_FORMATS, PILLOW_AVAILABLE, MergeSettings, check_merge_format, merge_images,
+                    output_format, save_options)
+from .package import MEDIA_PREFIX
+from .placement import parse_cell
+
+if PILLOW_AVAILABLE:
+    from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+DEFAULT_CACHE_MB = 64
+DEFAULT_MAX_WORKBOOKS = 8
+WORKBOOK_EXTENSIONS = ('.xlsx', '.xlsm')
+
+
+class MergeUnavailable(Exception):
+    """请求的单元格需要合并图片，但未安装Pillow库（返回 501）"""
+
+
+class ByteCache:
+    """按总字节数限制大小的LRU缓存：键 -> (Content-Type, 内容)；超过上限的单个内容不缓存"""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.items = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            value = self.items.get(key)
+            if value is not None:
+                self.items.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        if len(value[1]) > self.max_bytes:
+            return
+        with self.lock:
+            old = self.items.pop(key, None)
+            if old is not None:
+                self.size -= len(old[1])
+            self.items[key] = value
+            self.size += len(value[1])
+            while self.size > self.max_bytes:
+                _, (_, data) = self.items.popitem(last=False)
+                self.size -= len(data)
+
+
+class OpenWorkbook:
+    """打开的工作簿：压缩包句柄和图片位置索引。被淘汰时等正在使用它的请求结束后再关闭"""
+
+    def __init__(self, path, stamp):
+        self.path = path
+        self.stamp = stamp
+        self.zip_ref = zipfile.ZipFile(path, 'r')
+        try:
+            self.placements = read_placement_index(self.zip_ref)
+        except Exception:
+            self.zip_ref.close()
+            raise
+        self.users = 0
+        self.evicted = False
+
+
+class WorkbookCache:
+    """最近使用的工作簿（LRU），最多保持 max_workbooks 个打开"""
+
+    def __init__(self, max_workbooks=DEFAULT_MAX_WORKBOOKS):
+        self.max_workbooks = max(1, max_workbooks)
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def open(self, path):
+        """取得打开的工作簿；文件的修改时间或大小变化时重新打开"""
+        info = os.stat(path)
+        stamp = (info.st_mtime_ns, info.st_size)
+        with self.lock:
+            entry = self.entries.get(path)
+            if entry is not None and entry.stamp == stamp:
+                self.entries.move_to_end(path)
+                entry.users += 1
+            else:
+                entry = None
+        if entry is None:
+            # 解析绘图可能较慢，在锁外进行；其他线程同时打开了同一文件时使用先完成的那个
+            loaded = OpenWorkbook(path, stamp)
+            logger.info(f"打开工作簿: {path}（{len(loaded.placements.placements)} 个图片位置）")
+            with self.lock:
+                entry = self.entries.get(path)
+                if entry is None or entry.stamp != stamp:
+                    if entry is not None:
+                        self.evict(path)
+                    entry = self.entries[path] = loaded
+                    loaded = None
+                    while len(self.entries) > self.max_workbooks:
+                        self.evict(next(iter(self.entries)))
+                entry.users += 1
+            if loaded is not None:
+                loaded.zip_ref.close()
+        try:
+            yield entry
+        finally:
+            with self.lock:
+                entry.users -= 1
+                if entry.evicted and entry.users == 0:
+                    entry.zip_ref.close()
+
+    def evict(self, path):
+        """（持有锁时调用）移出缓存，没有请求在使用时立即关闭"""
+        entry = self.entries.pop(path)
+        entry.evicted = True
+        if entry.users == 0:
+            entry.zip_ref.close()
+
+    def close(self):
+        with self.lock:
+            for path in list(self.entries):
+                self.evict(path)
+
+
+class ImageService:
+    """按请求路径返回图片，与HTTP无关，也可以在程序中直接调用 get()"""
+
+    def __init__(self, root, settings=None, cache_bytes=DEFAULT_CACHE_MB * 1024 * 1024,
+                 max_workbooks=DEFAULT_MAX_WORKBOOKS):
+        self.root = os.path.realpath(root)
+        self.settings = settings or MergeSettings()
+        self.workbooks = WorkbookCache(max_workbooks)
+        self.cache = ByteCache(cache_bytes)
+
+    def close(self):
+        self.workbooks.close()
+
+    def resolve(self, name):
+        """工作簿名转换为根目录下的文件路径，不允许访问根目录以外的文件"""
+        path = os.path.realpath(os.path.join(self.root, name))
+        if os.path.commonpath([self.root, path]) != self.root or not name.lower().endswith(WORKBOOK_EXTENSIONS):
+            raise LookupError(f"工作簿不存在: {name}")
+        if not os.path.isfile(path):
+            raise LookupError(f"工作簿不存在: {name}")
+        return path
+
+    def get(self, request_path):
+        """返回 (Content-Type, 内容)；找不到时抛出 LookupError，请求无效时抛出 ValueError"""
+        segments = [unquote(segment) for segment in urlsplit(request_path).path.strip('/').split('/')]
+        if not segments[0] or len(segments) not in (1, 3, 4):
+            raise LookupError(f"无效的路径: {request_path}")
+        path = self.resolve(segments[0])
+        with self.workbooks.open(path) as workbook:
+            if len(segments) == 1:
+                return 'application/json', self.listing(workbook)
+            sheet, cell = segments[1], segments[2].upper()
+            col, row = parse_cell(cell)
+            if col is None or row is None:
+                raise ValueError(f"无效的单元格: {segments[2]}")
+            number = None
+            if len(segments) == 4:
+                if not segments[3].isdigit() or int(segments[3]) < 1:
+                    raise ValueError(f"无效的图片序号: {segments[3]}")
+                number = int(segments[3])
+            key = (path, workbook.stamp, sheet.casefold(), col, row, number)
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+            placements = sorted(workbook.placements.anchored_at(sheet, col, row),
+                                key=lambda placement: (placement.image_file, placement.number))
+            if not placements:
+                raise LookupError(f"{sheet}!{cell} 没有图片")
+            if number is not None:
+                if number > len(placements):
+                    raise LookupError(f"{sheet}!{cell} 只有 {len(placements)} 张图片")
+                placements = [placements[number - 1]]
+            if len(placements) == 1:
+                image_file = placements[0].image_file
+                value = (mimetypes.guess_type(image_file)[0] or 'application/octet-stream',
+                         workbook.zip_ref.read(MEDIA_PREFIX + image_file))
+            elif not PILLOW_AVAILABLE:
+                raise MergeUnavailable(f"{sheet}!{cell} 有 {len(placements)} 张图片，未安装Pillow库，无法合并")
+            else:
+                value = self.merge(workbook, f"{sheet}_{cell}", placements)
+            self.cache.put(key, value)
+            return value
+
+    def merge(self, workbook, item, placements):
+        """合并同一单元格的多张图片，设置与提取时的合并相同（需要Pillow库）"""
+        settings = self.settings
+        filenames = [placement.image_file for placement in placements]
+        image_format = output_format(filenames, settings.format)
+        sources = [(f"{item}/{placement.image_file}", partial(workbook.zip_ref.open, MEDIA_PREFIX + placement.image_file))
+                   for placement in placements]
+        merged_image = merge_images(sources, settings.max_pixels, allow_alpha=image_format != 'JPEG',
+                                    layout=settings.layout, columns=settings.columns,
+                                    bounds=[placement.location.get('bounds') for placement in placements])
+        if merged_image is None:
+            raise ValueError(f"合并失败: {item}")
+        buffer = io.BytesIO()
+        merged_image.save(buffer, image_format, **save_options(image_format, settings))
+        return Image.MIME.get(image_format, 'application/octet-stream'), buffer.getvalue()
+
+    def listing(self, workbook):
+        """工作簿中的图片位置：[{sheet, cell, images, is_group}, ...]，每个单元格一项"""
+        cells = OrderedDict()
+        for placement in workbook.placements.placements:
+            entry = cells.setdefault((placement.sheet, placement.location['cell']), {
+                'sheet': placement.sheet, 'cell': placement.location['cell'], 'images': [], 'is_group': False})
+            entry['images'].append(placement.image_file)
+            entry['is_group'] = entry['is_group'] or placement.location.get('is_group', False)
+        for entry in cells.values():
+            entry['images'].sort()
+        return json.dumps(list(cells.values()), ensure_ascii=False).encode('utf-8')
+
+
+class ImageRequestHandler(BaseHTTPRequestHandler):
+    server_version = "excel_extractor"
+
+    def do_GET(self):
+        try:
+            content_type, data = self.server.service.get(self.path)
+        except LookupError as e:
+            return self.send_text(404, str(e))
+        except ValueError as e:
+            return self.send_text(400, str(e))
+        except MergeUnavailable as e:
+            return self.send_text(501, str(e))
+        except Exception as e:
+            logger.error(f"处理请求 {self.path} 时出错: {str(e)}")
+            return self.send_text(500, str(e))
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def send_text(self, status, message):
+        data = message.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/plain; charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        # Unix 套接字的客户端没有地址，不使用 address_string()
+        logger.debug(format % args)
+
+
+if hasattr(socketserver, 'UnixStreamServer'):
+    class UnixImageServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+        daemon_threads = True
+else:  # Windows
+    UnixImageServer = None
+
+
+def make_server(service, host=DEFAULT_HOST, port=DEFAULT_PORT, unix_socket=None):
+    """创建HTTP服务（TCP 或 Unix 套接字），每个请求在单独的线程中处理"""
+    if unix_socket:
+        if UnixImageServer is None:
+            raise ValueError("当前系统不支持Unix套接字")
+        if os.path.exists(unix_socket):
+            os.remove(unix_socket)
+        server = UnixImageServer(unix_socket, ImageRequestHandler)
+    else:
+        server = ThreadingHTTPServer((host, port), ImageRequestHandler)
+    server.service = service
+    return server
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="excel_extractor.server",
+                                     description="本地图片服务：按单元格返回Excel文件中的图片或合并图片")
+    parser.add_argument("root", help="工作簿所在目录，请求路径中的工作簿名相对于此目录")
+    parser.add_argument("--host", default=DEFAULT_HOST, help=f"监听地址（默认 {DEFAULT_HOST}）")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help=f"端口（默认 {DEFAULT_PORT}）")
+    parser.add_argument("--unix-socket", default=None, help="改为监听此Unix套接字")
+    parser.add_argument("--cache-mb", type=int, default=DEFAULT_CACHE_MB,
+                        help=f"图片和合并结果缓存的大小上限（MB，默认 {DEFAULT_CACHE_MB}）")
+    parser.add_argument("--max-workbooks", type=int, default=DEFAULT_MAX_WORKBOOKS,
+                        help=f"保持打开的工作簿数（默认 {DEFAULT_MAX_WORKBOOKS}）")
+    parser.add_argument("--merge-layout", default="horizontal", choices=LAYOUT_MODES,
+                        help="合并图片的排列方式（默认 horizontal）")
+    parser.add_argument("--merge-columns", type=int, default=None,
+                        help=f"--merge-layout columns 的列数（默认 {DEFAULT_COLUMNS}）")
+    parser.add_argument("--merge-format", default="png", choices=MERGE_FORMATS, help="合并图片的格式（默认 png）")
+    parser.add_argument("--merge-max-pixels", type=int, default=None, help="合并图片的最大像素数（默认不限制）")
+    parser.add_argument("--log-level", default="INFO", choices=["DEBUG", "INFO", "WARNING", "ERROR"],
+                        help="日志级别（默认 INFO）")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    configure_logging(args.log_level)
+    try:
+        check_merge_format(args.merge_format)
+        check_layout(args.merge_layout, args.merge_columns)
+    except ValueError as e:
+        print(str(e), file=sys.stderr)
+        return 1
+    settings = MergeSettings(format=args.merge_format, max_pixels=args.merge_max_pixels,
+                             layout=args.merge_layout, columns=args.merge_columns)
+    service = ImageService(args.root, settings, args.cache_mb * 1024 * 1024, args.max_workbooks)
+    server = make_server(service, args.host, args.port, args.unix_socket)
+    address = args.unix_socket or f"http://{args.host}:{server.server_address[1]}/"
+    logger.info(f"图片服务已启动: {address}（工作簿目录 {service.root}）")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+        if args.unix_socket and os.path.exists(args.unix_socket):
+            os.remove(args.unix_socket)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
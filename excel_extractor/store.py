@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+"""
+按内容寻址的图片存储
+功能：每个不同内容的图片只在存储目录中保存一份（文件名为摘要），
+单元格目录中的文件通过 reflink / 硬链接 / 符号链接指向它，链接失败时退回复制。
+"""
+
+import os
+import errno
+import shutil
+import logging
+import threading
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# 存储目录名称（与"提取结果"、"合并结果"同级）
+STORE_DIR_NAME = "图片存储"
+# Linux FICLONE ioctl，btrfs / xfs 等文件系统支持写时复制克隆
+FICLONE = 0x40049409
+
+# copy 表示不使用存储，每个位置写出独立的副本（默认行为）
+LINK_MODES = ('copy', 'auto', 'reflink', 'hardlink', 'symlink')
+# 各模式依次尝试的链接方式，全部失败时复制
+LINK_METHODS = {
+    'auto': ('reflink', 'hardlink'),
+    'reflink': ('reflink',),
+    'hardlink': ('hardlink',),
+    'symlink': ('symlink',),
+}
+
+
+def reflink(src, dst):
+    """写时复制克隆文件，不支持时抛出 OSError"""
+    if fcntl is None:
+        raise OSError(errno.EOPNOTSUPP, "当前系统不支持reflink")
+    with open(src, 'rb') as s, open(dst, 'wb') as d:
+        try:
+            fcntl.ioctl(d.fileno(), FICLONE, s.fileno())
+            return
+        except OSError:
+            pass
+    os.remove(dst)
+    raise OSError(errno.EOPNOTSUPP, "文件系统不支持reflink")
+
+
+def hardlink(src, dst):
+    os.link(src, dst)
+
+
+def symlink(src, dst):
+    """创建相对路径的符号链接，整个输出目录移动后仍然有效"""
+    os.symlink(os.path.relpath(src, os.path.dirname(dst)), dst)
+
+
+LINKERS = {
+    'reflink': reflink,
+    'hardlink': hardlink,
+    'symlink': symlink,
+}
+
+
+def link_file(src, dst, link_mode='copy'):
+    """在 dst 创建 src 的链接并返回使用的方式；copy 模式只尝试 reflink，全部失败时复制"""
+    methods = ('reflink',) if link_mode == 'copy' else LINK_METHODS[link_mode]
+    for method in methods:
+        try:
+            LINKERS[method](src, dst)
+        except OSError:
+            continue
+        if method == 'reflink':
+            # 克隆得到的是新文件，保留源文件的修改时间
+            shutil.copystat(src, dst)
+        return method
+    shutil.copy2(src, dst)
+    return 'copy'
+
+
+class ContentStore:
+    def __init__(self, root, link_mode='auto'):
+        if link_mode not in LINK_METHODS:
+            raise ValueError(f"不支持的链接方式: {link_mode}")
+        self.root = root
+        self.link_mode = link_mode
+        # 失败过的链接方式在本次运行中不再尝试
+        self.methods = list(LINK_METHODS[link_mode])
+        self.stored_count = 0
+        self.link_counts = {}
+        # 写出线程池中的多个线程同时写入存储和统计
+        self.lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+        # 存储目录中已有的图片，判断是否需要写入时不再逐个检查磁盘
+        self.blobs = set(os.listdir(root))
+
+    def blob_path(self, digest, ext):
+        return os.path.join(self.root, f"{digest}{ext.lower()}")
+
+    def has_blob(self, digest, ext):
+        return os.path.basename(self.blob_path(digest, ext)) in self.blobs
+
+    def part_path(self, image_file):
+        """新图片先写到存储目录中的临时文件，摘要算出后再 commit"""
+        return os.path.join(self.root, f".{image_file}.part")
+
+    def commit(self, part_path, digest, ext):
+        """把临时文件保存为摘要命名的图片；相同内容已存在时丢弃临时文件"""
+        blob = self.blob_path(digest, ext)
+        with self.lock:
+            if os.path.basename(blob) in self.blobs:
+                os.remove(part_path)
+            else:
+                os.replace(part_path, blob)
+                self.blobs.add(os.path.basename(blob))
+                self.stored_count += 1
+        return blob
+
+    def link(self, digest, ext, dst_path):
+        """在 dst_path 创建指向存储图片的链接，返回实际使用的方式"""
+        blob = self.blob_path(digest, ext)
+        for method in list(self.methods):
+            try:
+                LINKERS[method](blob, dst_path)
+            except OSError as e:
+                with self.lock:
+                    if method in self.methods:
+                        logger.info(f"{method} 不可用，改用其他方式: {str(e)}")
+                        self.methods.remove(method)
+                continue
+            self.count_link(method)
+            return method
+        shutil.copy2(blob, dst_path)
+        self.count_link('copy')
+        return 'copy'
+
+    def remove_unreferenced(self, referenced):
+        """删除不在 referenced（存储文件名集合）中的图片，返回删除的数量；临时文件不处理"""
+        removed = 0
+        with self.lock:
+            for name in sorted(self.blobs - set(referenced)):
+                if name.startswith('.'):
+                    continue
+                try:
+                    os.remove(os.path.join(self.root, name))
+                except FileNotFoundError:
+                    pass
+                except OSError as e:
+                    logger.warning(f"警告: 无法删除存储中的图片 {name}: {str(e)}")
+                    continue
+                self.blobs.discard(name)
+                removed += 1
+        return removed
+
+    def count_link(self, method):
+        with self.lock:
+            self.link_counts[method] = self.link_counts.get(method, 0) + 1
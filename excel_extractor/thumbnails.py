@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+"""
+缩略图（可选，需要Pillow库）
+功能：在图片已经被解码的地方（近似重复检测、合并）顺便生成一个或多个尺寸的缩略图，
+每个图片成员只解码一次。缩略图先按成员写入暂存目录，提取结束后放到与"提取结果"平行的目录树：
+缩略图/<最大边长>/<单元格目录>/<文件名>，同一成员的其他位置使用链接或复制。
+"""
+
+import os
+import logging
+import threading
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+# 缩略图目录名称（与"提取结果"、"合并结果"同级）
+THUMBNAIL_DIR_NAME = "缩略图"
+STAGING_DIR_NAME = ".staging"
+JPEG_EXTENSIONS = ('.jpg', '.jpeg')
+THUMBNAIL_JPEG_QUALITY = 85
+# 缩小时先用 reduce 整数倍缩小，剩余部分再用高质量滤波（Pillow 的 reducing_gap）
+REDUCING_GAP = 2.0
+
+
+def parse_sizes(text):
+    """解析 "256,1024" 形式的尺寸列表，返回从大到小排列的元组"""
+    sizes = sorted({int(part) for part in text.split(',') if part.strip()}, reverse=True)
+    if not sizes or sizes[-1] < 1:
+        raise ValueError(f"缩略图尺寸必须为正整数: {text}")
+    return tuple(sizes)
+
+
+def thumbnail_name(filename):
+    """缩略图文件名：JPEG 保持原扩展名，其他格式保存为PNG"""
+    stem, ext = os.path.splitext(filename)
+    return filename if ext.lower() in JPEG_EXTENSIONS else stem + '.png'
+
+
+def fit_size(size, bound):
+    """把尺寸按比例缩小到不超过 bound x bound（不放大）"""
+    width, height = size
+    scale = min(1.0, bound / max(width, height))
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+class ThumbnailWriter:
+    """生成并暂存缩略图；只保存路径和尺寸，可以传给合并进程池"""
+
+    def __init__(self, root, sizes):
+        self.root = root
+        self.sizes = tuple(sorted(sizes, reverse=True))
+        self.staging_dir = os.path.join(root, STAGING_DIR_NAME)
+
+    def staged_path(self, size, member):
+        return os.path.join(self.staging_dir, str(size), thumbnail_name(os.path.basename(member)))
+
+    def output_path(self, size, item, filename):
+        return os.path.join(self.root, str(size), item, thumbnail_name(filename))
+
+    def is_staged(self, member):
+        return all(os.path.exists(self.staged_path(size, member)) for size in self.sizes)
+
+    def draft_size(self, size):
+        """解码时至少需要的尺寸（最大的缩略图尺寸）"""
+        return fit_size(size, self.sizes[0])
+
+    def render(self, member, img):
+        """从已解码的图片生成各尺寸缩略图并写入暂存目录；从大到小依次缩小，小尺寸复用上一级结果"""
+        jpeg = os.path.splitext(member)[1].lower() in JPEG_EXTENSIONS
+        thumb = img
+        # 调色板等模式先转换，缩放时才能使用高质量滤波
+        if jpeg and thumb.mode not in ('RGB', 'L'):
+            thumb = thumb.convert('RGB')
+        elif not jpeg and thumb.mode not in ('RGB', 'RGBA', 'L', 'LA'):
+            thumb = thumb.convert('RGBA')
+        for size in self.sizes:
+            target = fit_size(thumb.size, size)
+            if target != thumb.size:
+                thumb = thumb.resize(target, Image.LANCZOS, reducing_gap=REDUCING_GAP)
+            path = self.staged_path(size, member)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # 先写临时文件，合并时可能有多个线程或进程处理同一成员
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            if jpeg:
+                thumb.save(tmp_path, 'JPEG', quality=THUMBNAIL_JPEG_QUALITY)
+            else:
+                thumb.save(tmp_path, 'PNG', compress_level=1)
+            os.replace(tmp_path, path)
+
+    def render_member(self, zip_ref, member):
+        """单独解码压缩包中的成员生成缩略图；JPEG 用 draft 在解码时直接缩小"""
+        with zip_ref.open(member) as f, Image.open(f) as img:
+            img.draft(img.mode, self.draft_size(img.size))
+            self.render(member, img)
@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+import os
+import tempfile
+import unittest
+
+from excel_extractor import ExtractionOptions
+from excel_extractor.batch import run_batch
+
+from .workbooks import image_data, write_workbook
+
+
+class BatchMetricsTest(unittest.TestCase):
+    def test_metrics_file_per_workbook(self):
+        """批量模式下每个文件的指标文件分别保存"""
+        with tempfile.TemporaryDirectory() as tmp:
+            workbooks = []
+            for name in ('a', 'b'):
+                path = os.path.join(tmp, f'{name}.xlsx')
+                write_workbook(path, [image_data(1)])
+                workbooks.append(path)
+            metrics_file = os.path.join(tmp, 'metrics.prom')
+            batch = run_batch(workbooks, os.path.join(tmp, 'out'),
+                              ExtractionOptions(merge=False, metrics_file=metrics_file), workers=1)
+
+            self.assertEqual(batch.failures, [])
+            self.assertFalse(os.path.exists(metrics_file))
+            for name in ('a', 'b'):
+                with open(os.path.join(tmp, f'metrics_{name}.prom'), encoding='utf-8') as f:
+                    self.assertIn(f'workbook="{name}.xlsx"', f.read())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+import os
+import tempfile
+import unittest
+
+from excel_extractor import ExtractionOptions, extract
+from excel_extractor.hashing import CRC_KEY_PREFIX
+from excel_extractor.manifest import Manifest
+from excel_extractor.store import STORE_DIR_NAME
+
+from .workbooks import image_data, write_workbook
+
+
+class IncrementalStoreTest(unittest.TestCase):
+    def test_replaced_image_removes_unreferenced_blob(self):
+        """链接方式增量提取时，图片被替换后存储中只保留本次输出引用的图片"""
+        options = ExtractionOptions(merge=False, incremental=True, link_mode='hardlink')
+        with tempfile.TemporaryDirectory() as tmp:
+            workbook, output_dir = os.path.join(tmp, 'a.xlsx'), os.path.join(tmp, 'out')
+            write_workbook(workbook, [image_data(1), image_data(2)])
+            extract(workbook, output_dir, options)
+            write_workbook(workbook, [image_data(1), image_data(3)])
+            report = extract(workbook, output_dir, options)
+
+            store_dir = os.path.join(output_dir, STORE_DIR_NAME)
+            expected = sorted(f"{digest}.png" for digest in set(report.digests.values()))
+            self.assertEqual(sorted(os.listdir(store_dir)), expected)
+            self.assertEqual(report.removed_blob_count, 1)
+
+
+
+def list_files(root):
+    return sorted(os.path.relpath(os.path.join(directory, name), root)
+                  for directory, _, names in os.walk(root) for name in names if not name.startswith('.'))
+
+
+class IncrementalDigestTest(unittest.TestCase):
+    def test_crc_keys_not_exposed(self):
+        """未计算摘要的成员不出现在 report.digests 中，清单中摘要为空；之后出现相同内容时仍能正确去重"""
+        options = ExtractionOptions(merge=False, incremental=True)
+        with tempfile.TemporaryDirectory() as tmp:
+            workbook = os.path.join(tmp, 'a.xlsx')
+            incremental_dir, full_dir = os.path.join(tmp, 'incremental'), os.path.join(tmp, 'full')
+            write_workbook(workbook, [image_data(1), image_data(2)])
+            report = extract(workbook, incremental_dir, options)
+            self.assertEqual(report.digests, {})
+            manifest = Manifest.load(incremental_dir)
+            self.assertEqual({image['digest'] for image in manifest.images.values()}, {None})
+
+            # image3 与上次只用CRC32作键的 image1 内容相同
+            write_workbook(workbook, [image_data(1), image_data(2), image_data(1)])
+            report = extract(workbook, incremental_dir, options)
+            extract(workbook, full_dir, ExtractionOptions(merge=False))
+
+            self.assertEqual(set(report.digests), {'image1.png', 'image3.png'})
+            self.assertFalse(any(digest.startswith(CRC_KEY_PREFIX) for digest in report.digests.values()))
+            self.assertEqual(report.duplicate_count, 1)
+            self.assertEqual(list_files(incremental_dir), list_files(full_dir))
+
+
+if __name__ == '__main__':
+    unittest.main()
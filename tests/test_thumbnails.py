@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+import os
+import tempfile
+import unittest
+
+from excel_extractor import ExtractionOptions, PILLOW_AVAILABLE, extract
+from excel_extractor.thumbnails import THUMBNAIL_DIR_NAME
+
+from .workbooks import image_data, write_workbook
+
+
+def list_files(root):
+    return sorted(os.path.relpath(os.path.join(directory, name), root)
+                  for directory, _, names in os.walk(root) for name in names)
+
+
+@unittest.skipUnless(PILLOW_AVAILABLE, "需要Pillow库")
+class IncrementalThumbnailTest(unittest.TestCase):
+    def test_renamed_duplicate_keeps_thumbnail(self):
+        """成员未变而 _副本N 序号移动时，增量提取的缩略图与完整提取相同"""
+        options = ExtractionOptions(merge=False, incremental=True, thumbnail_sizes=(16,))
+        same, other = image_data(1), image_data(2)
+        with tempfile.TemporaryDirectory() as tmp:
+            workbook = os.path.join(tmp, 'a.xlsx')
+            incremental_dir, full_dir = os.path.join(tmp, 'incremental'), os.path.join(tmp, 'full')
+            write_workbook(workbook, [same, same, same])
+            extract(workbook, incremental_dir, options)
+            # image2 换成其他内容，image3 从 image3_副本2 变为 image3_副本1
+            write_workbook(workbook, [same, other, same])
+            report = extract(workbook, incremental_dir, options)
+            extract(workbook, full_dir, ExtractionOptions(merge=False, thumbnail_sizes=(16,)))
+
+            self.assertIn(('image3_副本1.png', 'image3.png'), report.placements['Sheet1_A21'])
+            expected = list_files(os.path.join(full_dir, THUMBNAIL_DIR_NAME))
+            self.assertIn(os.path.join('16', 'Sheet1_A21', 'image3_副本1.png'), expected)
+            self.assertEqual(list_files(os.path.join(incremental_dir, THUMBNAIL_DIR_NAME)), expected)
+            self.assertEqual(report.thumbnail_count, len(expected))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from excel_extractor import ExtractionOptions, extract
+from excel_extractor.engine import ExtractionEngine
+from excel_extractor.manifest import Manifest
+
+from .workbooks import corrupt_member, image_data, write_workbook
+
+
+class WriteErrorTest(unittest.TestCase):
+    def test_failed_target_skips_member(self):
+        """一个成员写出失败时只跳过该成员：删除写了一半的文件，不计入结果和清单，其他成员照常写出"""
+        copy_zip_member = ExtractionEngine.copy_zip_member
+
+        def failing_copy(engine, zip_ref, member_name, dst_path):
+            if member_name.endswith('image2.png'):
+                with open(dst_path, 'wb') as dst:
+                    dst.write(b'partial')
+                raise OSError("磁盘已满")
+            copy_zip_member(engine, zip_ref, member_name, dst_path)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            workbook, output_dir = os.path.join(tmp, 'a.xlsx'), os.path.join(tmp, 'out')
+            write_workbook(workbook, [image_data(1), image_data(2), image_data(3)])
+            with mock.patch.object(ExtractionEngine, 'copy_zip_member', failing_copy), \
+                    self.assertLogs('excel_extractor.engine', 'ERROR'):
+                report = extract(workbook, output_dir, ExtractionOptions(merge=False, incremental=True))
+
+            self.assertEqual(report.extracted_count, 2)
+            self.assertEqual(report.unique_count, 2)
+            self.assertNotIn('Sheet1_A11', report.placements)
+            self.assertFalse(os.path.exists(os.path.join(report.extract_dir, 'Sheet1_A11', 'image2.png')))
+            self.assertTrue(os.path.exists(os.path.join(report.extract_dir, 'Sheet1_A21', 'image3.png')))
+            self.assertEqual(sorted(Manifest.load(output_dir).images),
+                             ['提取结果/Sheet1_A1/image1.png', '提取结果/Sheet1_A21/image3.png'])
+
+
+    def test_corrupted_singleton_member(self):
+        """(大小, CRC32)唯一、预筛时没有读取的成员数据损坏时，与读取线程中失败的成员一样记录并跳过"""
+        for options in (ExtractionOptions(merge=False, incremental=True),
+                        ExtractionOptions(merge=False, incremental=True, link_mode='hardlink'),
+                        ExtractionOptions(merge=False, archive='zip')):
+            with self.subTest(link_mode=options.link_mode, archive=options.archive), \
+                    tempfile.TemporaryDirectory() as tmp:
+                workbook, output_dir = os.path.join(tmp, 'a.xlsx'), os.path.join(tmp, 'out')
+                write_workbook(workbook, [image_data(1), image_data(2), image_data(3)])
+                corrupt_member(workbook, 'xl/media/image2.png')
+                with self.assertLogs('excel_extractor.engine', 'WARNING') as logs:
+                    report = extract(workbook, output_dir, options)
+
+                self.assertTrue(any('计算文件哈希时出错 xl/media/image2.png' in line for line in logs.output))
+                self.assertEqual(report.extracted_count, 2)
+                self.assertEqual(sorted(report.placements), ['Sheet1_A1', 'Sheet1_A21'])
+                self.assertFalse(os.path.exists(os.path.join(report.extract_dir, 'Sheet1_A11', 'image2.png')))
+                if options.incremental:
+                    self.assertEqual(sorted(Manifest.load(output_dir).images),
+                                     ['提取结果/Sheet1_A1/image1.png', '提取结果/Sheet1_A21/image3.png'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+"""测试用的小型Excel文件：一个工作表，每张图片单独放在A列的一个锚点中"""
+
+import random
+import zipfile
+
+from excel_extractor.benchmark import (DOC_REL_NS, MAIN_NS, XDR_NS, A_NS, anchor_xml, picture_xml, png_bytes,
+                                       relationships)
+
+
+def image_data(seed, width=40, height=30):
+    """按种子生成内容唯一的PNG"""
+    return png_bytes(width, height, random.Random(seed))
+
+
+def write_workbook(path, images):
+    """images 为每张图片的内容，依次保存为 xl/media/image1.png ...，锚定在 A1、A11、A21 ..."""
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr('_rels/.rels', relationships([('rId1', 'officeDocument', 'xl/workbook.xml')]))
+        zf.writestr('xl/workbook.xml',
+                    f'<workbook xmlns="{MAIN_NS}" xmlns:r="{DOC_REL_NS}"><sheets>'
+                    f'<sheet name="Sheet1" sheetId="1" r:id="rId1"/></sheets></workbook>')
+        zf.writestr('xl/_rels/workbook.xml.rels', relationships([('rId1', 'worksheet', 'worksheets/sheet1.xml')]))
+        zf.writestr('xl/worksheets/sheet1.xml',
+                    f'<worksheet xmlns="{MAIN_NS}" xmlns:r="{DOC_REL_NS}"><sheetData/><drawing r:id="rId1"/></worksheet>')
+        zf.writestr('xl/worksheets/_rels/sheet1.xml.rels',
+                    relationships([('rId1', 'drawing', '../drawings/drawing1.xml')]))
+        anchors = []
+        for number, data in enumerate(images, 1):
+            zf.writestr(f'xl/media/image{number}.png', data)
+            anchors.append(anchor_xml((number - 1) * 10, 0, picture_xml(number + 1, f'rId{number}', 0, 0, 381000, 285750)))
+        zf.writestr('xl/drawings/drawing1.xml',
+                    f'<xdr:wsDr xmlns:xdr="{XDR_NS}" xmlns:a="{A_NS}" xmlns:r="{DOC_REL_NS}">'
+                    + ''.join(anchors) + '</xdr:wsDr>')
+        zf.writestr('xl/drawings/_rels/drawing1.xml.rels', relationships(
+            [(f'rId{number}', 'image', f'../media/image{number}.png') for number in range(1, len(images) + 1)]))
+
+
+def corrupt_member(path, member):
+    """改写压缩包中 member 的一个数据字节，中央目录不变，读取时CRC校验或解压失败"""
+    with zipfile.ZipFile(path) as zf:
+        info = zf.getinfo(member)
+    with open(path, 'r+b') as f:
+        f.seek(info.header_offset + 26)
+        name_length, extra_length = int.from_bytes(f.read(2), 'little'), int.from_bytes(f.read(2), 'little')
+        offset = info.header_offset + 30 + name_length + extra_length + info.compress_size // 2
+        f.seek(offset)
+        byte = f.read(1)
+        f.seek(offset)
+        f.write(bytes([byte[0] ^ 0xFF]))